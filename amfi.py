@@ -0,0 +1,82 @@
+import datetime
+
+from db import get_connection
+from providers import get_provider
+from securities import store_security
+from snapshots import rebuild_dates
+
+AMFI_NAV_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
+NAV_MAX_AGE_DAYS = 4  # A Friday NAV still stands over a weekend plus a holiday
+
+
+def _lines(source):
+    """Streams text lines from a local path, or from an http(s) URL via the market-data provider."""
+    if source.startswith(("http://", "https://")):
+        yield from get_provider().get_nav_file(source)
+    else:
+        with open(source, encoding="utf-8", errors="replace") as handle:
+            yield from handle
+
+
+def parse_nav_lines(lines):
+    """Yields (scheme_code, scheme_name, nav, date) from NAVAll.txt lines.
+
+    Rows look like `code;isin_growth;isin_reinvest;name;nav;17-Oct-2025`; the
+    header, fund-house and category lines, and rows without a numeric NAV
+    ("N.A.") are skipped.
+    """
+    for line in lines:
+        fields = line.strip().split(";")
+        if len(fields) < 6 or not fields[0].isdigit():
+            continue
+        try:
+            nav = float(fields[4])
+            date = datetime.datetime.strptime(fields[5].strip(), "%d-%b-%Y").date().isoformat()
+        except ValueError:
+            continue
+        yield fields[0], fields[3].strip(), nav, date
+
+
+def get_scheme(scheme_code, max_age_days=NAV_MAX_AGE_DAYS, conn=None):
+    """Returns (name, nav, date) for a scheme from the last ingested file, or None. Never touches the network.
+
+    Every parsed scheme, held or not, is stored in amfi_schemes, so lookups
+    stay free in later sessions; a NAV dated more than `max_age_days` ago
+    counts as missing.
+    """
+    conn = conn or get_connection()
+    since = (datetime.date.today() - datetime.timedelta(days=max_age_days)).isoformat()
+    row = conn.execute(
+        "SELECT name, nav, date FROM amfi_schemes WHERE scheme_code = ? AND date >= ?", (str(scheme_code), since)
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+def ingest_nav_file(source=AMFI_NAV_URL, conn=None):
+    """Parses one AMFI NAVAll file and upserts the NAV and name of every held mutual fund in one transaction.
+
+    Every parsed scheme is also stored in amfi_schemes, so later get_scheme()
+    lookups are free, in this session or the next. Snapshots for the NAV
+    dates written are rebuilt.
+    Returns the number of held schemes updated.
+    """
+    conn = conn or get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT symbol FROM portfolio WHERE investment_type = 'Mutual Fund'")
+    held = {row[0] for row in cursor.fetchall()}
+
+    parsed = {}
+    for scheme_code, name, nav, date in parse_nav_lines(_lines(source)):
+        parsed[scheme_code] = (name, nav, date)
+
+    rows = [(code, parsed[code][2], parsed[code][1]) for code in held if code in parsed]
+    with conn:
+        conn.executemany("REPLACE INTO amfi_schemes (scheme_code, name, nav, date) VALUES (?, ?, ?, ?)",
+                         ((code, *scheme) for code, scheme in parsed.items()))
+        conn.executemany("REPLACE INTO price_history (symbol, date, price) VALUES (?, ?, ?)", rows)
+        for code, _, _ in rows:
+            store_security(code, "Mutual Fund", {"name": parsed[code][0], "currency": "INR"}, commit=False)
+        rebuild_dates(conn, [date for _, date, _ in rows])
+
+    print(f"✅ Parsed {len(parsed)} schemes; updated NAVs for {len(rows)} of {len(held)} held mutual funds")
+    return len(rows)
@@ -0,0 +1,100 @@
+import datetime
+import threading
+
+import pandas as pd
+
+from db import get_connection
+from providers import get_provider
+
+PERIOD_DAYS = {"1mo": 30, "6mo": 182, "1y": 365, "2y": 730, "5y": 1826}
+
+_stats = {"hits": 0, "misses": 0, "fetched_bars": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def cache_stats():
+    """Returns a copy of the hit/miss counters (a hit is a range answered with no network call)."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _day(date, offset):
+    return (datetime.date.fromisoformat(date) + datetime.timedelta(days=offset)).isoformat()
+
+
+def _store(conn, symbol, bars, first_date, today):
+    # Coverage ends at the last bar actually returned, so a day whose bar was missing is asked for again
+    last_date = max(bar[0] for bar in bars) if bars else first_date
+    with conn:
+        conn.executemany("""
+            REPLACE INTO ohlc_bars (symbol, date, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(symbol, *bar) for bar in bars])
+        conn.execute("""
+            INSERT INTO ohlc_coverage (symbol, first_date, last_date, checked_on) VALUES (?, ?, ?, ?)
+            ON CONFLICT(symbol) DO UPDATE SET
+                first_date = MIN(first_date, excluded.first_date),
+                last_date = MAX(last_date, excluded.last_date),
+                checked_on = excluded.checked_on
+        """, (symbol, first_date, last_date, today))
+
+
+def get_bars(symbol, start, end=None, provider=None):
+    """Returns a DataFrame of daily OHLCV bars for [start, end], served from the local store.
+
+    Only the parts of the range not covered yet are fetched: older history
+    before the first cached day, and (at most once per day per symbol) the
+    bars from the last cached day on. That last day is fetched again because
+    its bar may have been stored while the session was still trading. If the
+    provider fails, whatever is cached is returned.
+    """
+    today = datetime.date.today().isoformat()
+    end = min(end or today, today)
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT first_date, last_date, checked_on FROM ohlc_coverage WHERE symbol = ?", (symbol,))
+    coverage = cursor.fetchone()
+
+    gaps = []
+    if coverage is None:
+        gaps.append((start, end))
+    else:
+        first_date, last_date, checked_on = coverage
+        if start < first_date:
+            gaps.append((start, _day(first_date, -1)))
+        if end >= last_date and checked_on < today:
+            gaps.append((last_date, end))
+
+    if gaps:
+        _count("misses")
+        provider = provider or get_provider()
+        for gap_start, gap_end in gaps:
+            try:
+                bars = provider.get_history(symbol, gap_start, gap_end)
+            except Exception as e:
+                print(f"⚠️ Error fetching history for {symbol}, using cached bars: {e}")
+                continue
+            _count("fetched_bars", len(bars))
+            if bars or coverage is not None:
+                _store(conn, symbol, bars, gap_start, today)
+    else:
+        _count("hits")
+
+    bars = pd.read_sql_query("""
+        SELECT date, open, high, low, close, volume FROM ohlc_bars
+        WHERE symbol = ? AND date >= ? AND date <= ?
+        ORDER BY date
+    """, conn, params=(symbol, start, end))
+    bars["date"] = pd.to_datetime(bars["date"])
+    return bars.set_index("date")
+
+
+def get_close_history(symbol, period="1mo", provider=None):
+    """Closing prices for a yfinance-style period ("1mo", "6mo", "1y", ...) as a date-indexed Series."""
+    start = (datetime.date.today() - datetime.timedelta(days=PERIOD_DAYS.get(period, 30))).isoformat()
+    return get_bars(symbol, start, provider=provider)["close"].rename("Close")
@@ -0,0 +1,132 @@
+"""Benchmarks latest/previous price lookups on a synthetic price_history.
+
+Usage: python -m benchmarks.latest_price [--symbols 1000] [--years 10]
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from schema import PRICE_HISTORY_INDEX_DDL, LATEST_PRICE_DDL, LATEST_PRICE_TRIGGERS, rebuild_latest_price
+
+LEGACY_DDL = """
+    CREATE TABLE price_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT NOT NULL,
+        date TEXT NOT NULL,
+        price REAL NOT NULL
+    )
+"""
+
+
+def trading_days(years):
+    day = datetime.date.today() - datetime.timedelta(days=365 * years)
+    end = datetime.date.today()
+    while day <= end:
+        if day.weekday() < 5:
+            yield day.isoformat()
+        day += datetime.timedelta(days=1)
+
+
+def populate(conn, symbols, days):
+    rng = random.Random(42)
+    for symbol in symbols:
+        price = rng.uniform(10, 1000)
+        rows = []
+        for day in days:
+            price *= 1 + rng.gauss(0, 0.01)
+            rows.append((symbol, day, round(price, 4)))
+        conn.executemany("INSERT INTO price_history (symbol, date, price) VALUES (?, ?, ?)", rows)
+    conn.commit()
+
+
+def timed(label, fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<55} {best * 1000:10.2f} ms")
+    return best
+
+
+def latest_via_group_by(conn):
+    return conn.execute("""
+        SELECT symbol, price FROM price_history
+        WHERE (symbol, date) IN (SELECT symbol, MAX(date) FROM price_history GROUP BY symbol)
+    """).fetchall()
+
+
+def last_two_per_symbol(conn, symbols):
+    return [conn.execute(
+        "SELECT price FROM price_history WHERE symbol = ? ORDER BY date DESC LIMIT 2", (symbol,)
+    ).fetchall() for symbol in symbols]
+
+
+def latest_table(conn):
+    return conn.execute("SELECT symbol, price, prev_price FROM latest_price").fetchall()
+
+
+def latest_table_per_symbol(conn, symbols):
+    return [conn.execute(
+        "SELECT price, prev_price FROM latest_price WHERE symbol = ?", (symbol,)
+    ).fetchone() for symbol in symbols]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=10)
+    args = parser.parse_args()
+
+    symbols = [f"SYM{i:05d}" for i in range(args.symbols)]
+    days = list(trading_days(args.years))
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    conn = sqlite3.connect(path)
+
+    print(f"📦 Building {len(symbols):,} symbols × {len(days):,} days = {len(symbols) * len(days):,} rows in {path}")
+    start = time.perf_counter()
+    conn.execute(LEGACY_DDL)
+    populate(conn, symbols, days)
+    print(f"  built in {time.perf_counter() - start:.1f}s")
+
+    print("\n🐢 No index (create_price_history_table schema)")
+    timed("latest per symbol, MAX(date) GROUP BY", lambda: latest_via_group_by(conn), repeat=1)
+    sample = symbols[:50]
+    per_symbol = timed(f"ORDER BY date DESC LIMIT 2 × {len(sample)} symbols", lambda: last_two_per_symbol(conn, sample), repeat=1)
+    print(f"  {'  → extrapolated to all symbols':<55} {per_symbol * len(symbols) / len(sample) * 1000:10.2f} ms")
+
+    print("\n📇 Covering (symbol, date, price) index")
+    start = time.perf_counter()
+    conn.execute(PRICE_HISTORY_INDEX_DDL)
+    print(f"  index built in {time.perf_counter() - start:.1f}s")
+    timed("latest per symbol, MAX(date) GROUP BY", lambda: latest_via_group_by(conn))
+    timed(f"ORDER BY date DESC LIMIT 2 × {len(symbols)} symbols", lambda: last_two_per_symbol(conn, symbols))
+
+    print("\n⚡ latest_price table")
+    start = time.perf_counter()
+    conn.execute(LATEST_PRICE_DDL)
+    for trigger in LATEST_PRICE_TRIGGERS:
+        conn.execute(trigger)
+    rebuild_latest_price(conn)
+    conn.commit()
+    print(f"  materialized in {time.perf_counter() - start:.1f}s")
+    timed("full scan of latest_price", lambda: latest_table(conn))
+    timed(f"primary-key lookup × {len(symbols)} symbols", lambda: latest_table_per_symbol(conn, symbols))
+
+    next_day = (datetime.date.fromisoformat(days[-1]) + datetime.timedelta(days=1)).isoformat()
+    rows = [(symbol, next_day, 1.0) for symbol in symbols]
+
+    def write_day():
+        with conn:
+            conn.executemany("REPLACE INTO price_history (symbol, date, price) VALUES (?, ?, ?)", rows)
+
+    timed(f"write one day for {len(symbols)} symbols (trigger maintained)", write_day)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
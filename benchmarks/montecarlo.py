@@ -0,0 +1,48 @@
+"""Benchmarks Monte Carlo goal simulation throughput across path counts and worker processes.
+
+Usage: python -m benchmarks.montecarlo [--paths 10000 100000 1000000] [--workers 1 2 4] [--months 120]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from simulation import BLOCK_PATHS, simulate_paths
+
+SEED = 42
+TARGET = 2_500_000
+
+
+def timed(fn, repeat=3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--months", type=int, default=120)
+    args = parser.parse_args()
+
+    print(f"🎲 {args.months} monthly steps, {BLOCK_PATHS:,} paths per block, {os.cpu_count()} CPU(s) available")
+    print(f"  {'paths':>10} {'workers':>8} {'seconds':>9} {'paths/s':>13} {'P(target)':>10}")
+    for paths in args.paths:
+        baseline = None
+        for workers in args.workers:
+            seconds, finals = timed(lambda: simulate_paths(500000, 10000, args.months, 0.11, 0.16,
+                                                           paths=paths, seed=SEED, workers=workers))
+            probability = (finals >= TARGET).mean()
+            if baseline is None:
+                baseline = finals
+            match = "" if np.array_equal(finals, baseline) else "  ⚠️ differs from workers=1"
+            print(f"  {paths:>10,} {workers:>8} {seconds:>9.3f} {paths / seconds:>13,.0f} {probability:>10.4f}{match}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Benchmarks the CLI's hot paths on a synthetic portfolio.db against a stub data source.
+
+Usage: python -m benchmarks.pipeline [--holdings 1000] [--symbols 200] [--years 5] [--repeat 5]
+                                     [--output bench.json] [--baseline old.json] [--threshold 1.25]
+
+Times initialize_db (cold and warm), update_price_history, get_portfolio_insights,
+view_historical_performance and the option 2 valuation path, reports p50/p95/max
+latency and peak traced memory, and saves everything as JSON. With --baseline,
+exits non-zero when any p50 got slower than `threshold` times the baseline's.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import db
+import fx
+from migrations import migrate
+from providers import StubProvider, set_provider
+
+
+def trading_days(years):
+    day = datetime.date.today() - datetime.timedelta(days=365 * years)
+    end = datetime.date.today() - datetime.timedelta(days=1)  # Leave today for update_price_history
+    while day <= end:
+        if day.weekday() < 5:
+            yield day.isoformat()
+        day += datetime.timedelta(days=1)
+
+
+def build_database(path, holdings, symbols, years, seed=42):
+    """Creates a migrated database with `holdings` lots over `symbols` symbols and daily prices/FX for `years`."""
+    rng = random.Random(seed)
+    days = list(trading_days(years))
+    db.set_db_path(path)
+    conn = db.get_connection()
+    migrate(conn)
+
+    universe = []
+    for i in range(symbols):
+        kind = i % 4
+        if kind == 3:
+            universe.append(("Mutual Fund", str(100000 + i), "INR"))
+        elif kind == 2:
+            universe.append(("Stock", f"SYM{i:05d}", "USD"))
+        else:
+            universe.append(("Stock", f"SYM{i:05d}.NS", "INR"))
+
+    sectors = ["Technology", "Financial Services", "Energy", "Healthcare", "Consumer Cyclical"]
+    lots = []
+    for _ in range(holdings):
+        investment_type, symbol, currency = rng.choice(universe)
+        sector = "N/A" if investment_type == "Mutual Fund" else rng.choice(sectors)
+        lots.append((investment_type, symbol, f"{symbol} Ltd.", sector, sector, rng.choice(days),
+                     round(rng.uniform(10, 1000), 2), rng.randint(1, 100), currency))
+
+    with conn:
+        conn.executemany("""
+            INSERT INTO portfolio (investment_type, symbol, name, sector, industry, purchase_date, purchase_price, units, currency)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, lots)
+        for _, symbol, _ in universe:
+            price = rng.uniform(10, 1000)
+            rows = []
+            for day in days:
+                price *= 1 + rng.gauss(0, 0.01)
+                rows.append((symbol, day, round(price, 4)))
+            conn.executemany("INSERT INTO price_history (symbol, date, price) VALUES (?, ?, ?)", rows)
+        conn.executemany(
+            "REPLACE INTO fx_rates (base, quote, date, rate, fetched_at) VALUES ('USD', 'INR', ?, ?, 0)",
+            [(day, round(83 + rng.gauss(0, 0.5), 2)) for day in days],
+        )
+    return len(days)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(fn, repeat, setup=None):
+    """Runs fn `repeat` times (after setup, untimed), then once more under tracemalloc for peak memory."""
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        if setup:
+            setup()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "runs": repeat,
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+        "peak_kib": peak // 1024,
+    }
+
+
+def valuation_path(provider):
+    """Option 2 minus rendering: quotes, previous prices, vectorized valuation and totals."""
+    from database import get_usd_to_inr, view_portfolio
+    from valuation import fetch_portfolio_quotes, get_previous_prices, holdings_frame, value_holdings, portfolio_totals
+
+    records = view_portfolio()
+    quotes = fetch_portfolio_quotes(records, provider)
+    get_previous_prices(db.get_connection())
+    holdings = holdings_frame(records)
+    holdings = holdings[holdings["purchase_price"].notna()]
+    usd_rate = get_usd_to_inr() if (holdings["currency"] == "USD").any() else 1
+    return portfolio_totals(value_holdings(holdings, quotes, usd_rate))
+
+
+def run_benchmarks(args):
+    from database import initialize_db, update_price_history, get_portfolio_insights, view_historical_performance
+
+    provider = StubProvider()
+    set_provider(provider)
+    fx.clear_cache()
+
+    def bump_prices():
+        provider.default_price += 0.01  # Every refresh writes changed prices, like a real trading day
+
+    today = datetime.date.today()
+    year_ago = (today - datetime.timedelta(days=365)).isoformat()
+    results = {}
+
+    def report(name, result):
+        results[name] = result
+        print(f"  {name:<36} p50 {result['p50_ms']:10.2f} ms   p95 {result['p95_ms']:10.2f} ms   "
+              f"peak {result['peak_kib'] / 1024:8.1f} MiB")
+
+    report("initialize_db (cold)", measure(initialize_db, 1, setup=_drop_snapshots))
+    report("initialize_db (warm)", measure(initialize_db, args.repeat))
+    report("update_price_history", measure(lambda: update_price_history(provider), args.repeat, setup=bump_prices))
+    report("get_portfolio_insights", measure(get_portfolio_insights, args.repeat))
+    report("view_historical_performance (30d)", measure(view_historical_performance, args.repeat))
+    report("view_historical_performance (1y)",
+           measure(lambda: view_historical_performance(year_ago, today.isoformat()), args.repeat))
+    report("valuation path (option 2)", measure(lambda: valuation_path(provider), args.repeat))
+    return results
+
+
+def _drop_snapshots():
+    conn = db.get_connection()
+    with conn:
+        conn.execute("DELETE FROM portfolio_history")
+
+
+def compare(results, baseline_path, threshold):
+    """Prints p50 ratios against a saved run; returns the names that regressed beyond `threshold`."""
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)["results"]
+    regressions = []
+    print(f"\n📊 Against {baseline_path} (threshold ×{threshold})")
+    for name, result in results.items():
+        if name not in baseline or not baseline[name]["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / baseline[name]["p50_ms"]
+        flag = "❌" if ratio > threshold else "✅"
+        print(f"  {flag} {name:<36} ×{ratio:.2f}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holdings", type=int, default=1000)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed p50 slowdown ratio (default: 1.25)")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "portfolio.db")
+    print(f"📦 Building {args.holdings:,} holdings over {args.symbols:,} symbols × {args.years} years in {path}")
+    start = time.perf_counter()
+    days = build_database(path, args.holdings, args.symbols, args.years)
+    print(f"  {args.symbols * days:,} prices built in {time.perf_counter() - start:.1f}s\n")
+
+    results = run_benchmarks(args)
+    report = {
+        "config": {"holdings": args.holdings, "symbols": args.symbols, "years": args.years, "repeat": args.repeat},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\n💾 Saved results to {args.output}")
+
+    if args.baseline and compare(results, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
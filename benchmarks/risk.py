@@ -0,0 +1,104 @@
+"""Benchmarks the risk window: full build versus the daily incremental update, on a synthetic portfolio.db.
+
+Usage: python -m benchmarks.risk [--symbols 1000] [--years 10] [--window 252 2520] [--days 5]
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import db
+import risk
+
+
+def trading_days(years, held_back):
+    day = datetime.date.today() - datetime.timedelta(days=365 * years)
+    end = datetime.date.today() - datetime.timedelta(days=held_back)  # Leave the last days for incremental updates
+    while day <= end:
+        if day.weekday() < 5:
+            yield day.isoformat()
+        day += datetime.timedelta(days=1)
+
+
+def build_database(path, symbols, days, seed=42):
+    """Creates a migrated database holding one lot of every symbol with a random-walk price per trading day."""
+    rng = np.random.default_rng(seed)
+    db.set_db_path(path)
+    conn = db.get_connection()
+    # A common market factor plus noise, so the correlations are not all zero
+    market = rng.normal(0.0003, 0.009, len(days))
+    walks = 100 * np.exp(np.cumsum(market[:, None] + rng.normal(0, 0.012, (len(days), len(symbols))), axis=0))
+    with conn:
+        conn.executemany("""
+            INSERT INTO portfolio (investment_type, symbol, name, purchase_date, purchase_price, units, currency)
+            VALUES ('Stock', ?, ?, ?, 100, 10, 'INR')
+        """, [(symbol, symbol, days[0]) for symbol in symbols])
+        for i, day in enumerate(days):
+            conn.executemany("INSERT INTO price_history (symbol, date, price) VALUES (?, ?, ?)",
+                             zip(symbols, [day] * len(symbols), walks[i].round(4).tolist()))
+    return conn
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<55} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--window", type=int, nargs="+", default=[252, 2520])
+    parser.add_argument("--days", type=int, default=5, help="most recent days to append one at a time")
+    args = parser.parse_args()
+
+    symbols = [f"SYM{i:05d}.NS" for i in range(args.symbols)]
+    days = list(trading_days(args.years, args.days))
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"📦 Building {len(symbols):,} symbols × {len(days):,} days = {len(symbols) * len(days):,} prices in {path}")
+    start = time.perf_counter()
+    conn = build_database(path, symbols, days)
+    print(f"  built in {time.perf_counter() - start:.1f}s")
+
+    rng = np.random.default_rng(7)
+    for window in args.window:
+        print(f"\n📐 Window of {window} trading days")
+        with conn:
+            conn.execute("DELETE FROM risk_state")
+        risk._windows.clear()
+        state = timed("full build (read prices, moments, save)", lambda: risk.update_window(conn, symbols, window))
+        timed("unchanged prices, in memory", lambda: risk.update_window(conn, symbols, window))
+        risk._windows.clear()
+        timed("unchanged prices, new process (read stored window)", lambda: risk.update_window(conn, symbols, window))
+        timed("recompute covariance from scratch (np.cov)", lambda: np.cov(state.returns, rowvar=False))
+
+        last, prices = state.dates[-1], state.prices[-1].copy()
+        for offset in range(args.days - 1, -1, -1):
+            day = (datetime.date.today() - datetime.timedelta(days=offset)).isoformat()
+            prices *= 1 + rng.normal(0, 0.012, len(symbols))
+            with conn:
+                conn.executemany("REPLACE INTO price_history (symbol, date, price) VALUES (?, ?, ?)",
+                                 zip(symbols, [day] * len(symbols), prices.round(4).tolist()))
+            if offset == 0:
+                risk._windows.clear()
+                state = timed(f"incremental update for {day}, new process", lambda: risk.update_window(conn, symbols, window))
+            else:
+                state = timed(f"incremental update for {day}", lambda: risk.update_window(conn, symbols, window))
+
+        fresh = risk.RiskWindow(symbols, window, state.dates, state.prices)
+        drift = np.nanmax(np.abs(state.covariance() - fresh.covariance()))
+        print(f"  max |incremental - recomputed| covariance: {drift:.2e}")
+        rows, summary = timed("portfolio_risk (update + metrics)", lambda: risk.portfolio_risk(window, None, conn))
+        print(f"  volatility {summary['volatility']:.2%}, 1-day 99% VaR ₹{summary['var']['99%']['historical']:,.0f}")
+        with conn:
+            conn.execute("DELETE FROM price_history WHERE date > ?", (last,))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Measures cold start of main.py to its first prompt against a startup budget.
+
+Usage: python -m benchmarks.startup [--runs 10] [--budget-ms 150] [--db portfolio.db]
+
+Each run starts `main.py` fresh, answers "4" (exit) at the menu and times the
+whole process; the bare interpreter's start time is subtracted so the budget
+covers only our imports and initialize_db(). Also lists any heavy module
+(pandas, yfinance, requests, ...) imported before the prompt. Exits non-zero
+when over budget or when a heavy module leaks into startup.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "yfinance", "requests", "tabulate", "npyscreen", "pick", "dotenv")
+
+
+def run(args, env, stdin=b""):
+    start = time.perf_counter()
+    result = subprocess.run(args, input=stdin, env=env, cwd=ROOT, capture_output=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"❌ {' '.join(args)} failed:\n{result.stderr.decode()}")
+    return elapsed, result
+
+
+def heavy_imports(env):
+    """Top-level packages from HEAVY_MODULES that main.py imports before showing the menu."""
+    _, result = run([sys.executable, "-X", "importtime", "main.py"], env, b"4\n")
+    loaded = set()
+    for line in result.stderr.decode().splitlines():
+        module = line.rsplit("|", 1)[-1].strip()
+        if module.split(".")[0] in HEAVY_MODULES:
+            loaded.add(module.split(".")[0])
+    return sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    parser.add_argument("--db", default=os.path.join(ROOT, "portfolio.db"), help="database to copy for the runs")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "portfolio.db")
+    if os.path.exists(args.db):
+        shutil.copy(args.db, db_path)
+    env = dict(os.environ, PORTFOLIO_DB=db_path, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("PORTFOLIO_PROFILE", None)
+
+    run([sys.executable, "main.py"], env, b"4\n")  # Warm the OS file cache and migrate the copy
+    bare = statistics.median(run([sys.executable, "-c", "pass"], env)[0] for _ in range(args.runs))
+    starts = [run([sys.executable, "main.py"], env, b"4\n")[0] for _ in range(args.runs)]
+    overhead = (statistics.median(starts) - bare) * 1000
+
+    print(f"🐍 bare interpreter        {bare * 1000:8.1f} ms (median of {args.runs})")
+    print(f"🚀 main.py to first prompt {statistics.median(starts) * 1000:8.1f} ms (max {max(starts) * 1000:.1f} ms)")
+    print(f"📏 startup overhead        {overhead:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    heavy = heavy_imports(env)
+    if heavy:
+        print(f"⚠️ Heavy modules imported before the prompt: {', '.join(heavy)}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    if overhead > args.budget_ms or heavy:
+        print("❌ Startup budget exceeded")
+        sys.exit(1)
+    print("✅ Within startup budget")
+
+
+if __name__ == "__main__":
+    main()
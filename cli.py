@@ -0,0 +1,331 @@
+"""Non-interactive subcommands for scripts and cron; without a command the interactive menu runs.
+
+Examples:
+    python main.py refresh                      # nightly price refresh
+    python main.py snapshot --from 2024-01-01   # rebuild missing portfolio_history rows
+    python main.py value --format csv           # per-lot valuation at live prices
+    python main.py insights
+    python main.py history --from 2025-01-01 --to 2025-03-31
+    python main.py import tradebook.csv         # bulk-load a broker tradebook or CAS statement
+    python main.py sell INFY.NS --units 10 --price 1650
+    python main.py pnl --since 2025-04-01       # realized P&L this financial year, unrealized as of today
+    python main.py returns --from 2025-01-01    # XIRR per holding and portfolio, TWR since January
+    python main.py simulate --seed 7            # probability of reaching each goal
+    python main.py risk --window 504            # volatility, VaR and beta over two years
+"""
+import argparse
+import contextlib
+import csv
+import datetime
+import json
+import math
+import sys
+
+import instrumentation
+
+
+def _clean(value):
+    """Makes numpy scalars and NaN (anywhere in nested dicts/lists) JSON/CSV friendly."""
+    if isinstance(value, dict):
+        return {key: _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def emit(document, rows, fmt, out=None):
+    """Writes `document` as JSON, or the flat `rows` (list of dicts) as CSV."""
+    out = out or sys.stdout
+    if fmt == "csv":
+        if rows:
+            writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(_clean(row) for row in rows)
+        return
+    json.dump(_clean(document), out, indent=2)
+    out.write("\n")
+
+
+def cmd_refresh(args):
+    """Fetches today's prices for every holding and records them (no progress output)."""
+    from database import get_usd_to_inr
+    from db import get_connection
+    from price_refresh import refresh_prices
+
+    today = datetime.date.today().isoformat()
+    recorded = refresh_prices(get_connection(), today=today, usd_rate=get_usd_to_inr())
+    rows = [{"symbol": symbol, "date": today, "price": price, "previous_price": previous}
+            for symbol, price, previous in recorded]
+    return {"date": today, "recorded": len(rows), "prices": rows}, rows
+
+
+def cmd_snapshot(args):
+    """Builds any missing portfolio_history rows from stored prices (no network)."""
+    from db import get_connection
+    from migrations import migrate
+    from snapshots import backfill
+
+    conn = get_connection()
+    migrate(conn)
+    written = backfill(conn, args.start, args.end)
+    row = {"rows_written": written, "from": args.start, "to": args.end}
+    return row, [row]
+
+
+def cmd_value(args):
+    """Values every lot at live prices (or the last stored ones with --stored), plus portfolio totals."""
+    from database import get_usd_to_inr, view_portfolio
+    from db import get_connection
+    from valuation import fetch_portfolio_quotes, holdings_frame, load_prices, portfolio_totals, value_holdings
+
+    records = view_portfolio()
+    prices = load_prices(get_connection()) if args.stored else fetch_portfolio_quotes(records)
+    holdings = holdings_frame(records)
+    holdings = holdings[holdings["purchase_price"].notna()]
+    usd_rate = get_usd_to_inr() if (holdings["currency"] == "USD").any() else 1
+    valued = value_holdings(holdings, prices, usd_rate)
+
+    rows = valued.to_dict(orient="records")
+    return {"usd_rate": usd_rate, "totals": portfolio_totals(valued), "holdings": rows}, rows
+
+
+def cmd_insights(args):
+    """Industry and geographic allocation of stock holdings, with concentration warnings."""
+    from database import get_portfolio_insights
+
+    allocations, warnings, geographic = get_portfolio_insights()
+    industries = [{"industry": industry, "value": value, "percentage": percentage, "risk_level": risk}
+                  for industry, value, percentage, risk in allocations]
+    regions = [{"currency": currency, "value": value, "percentage": percentage}
+               for currency, value, percentage in geographic]
+    rows = [{"group": "industry", "key": row["industry"], "value": row["value"], "percentage": row["percentage"]}
+            for row in industries]
+    rows += [{"group": "currency", "key": row["currency"], "value": row["value"], "percentage": row["percentage"]}
+             for row in regions]
+    return {"industries": industries, "geographic": regions, "warnings": warnings}, rows
+
+
+def cmd_history(args):
+    """Daily portfolio value/cost/P&L/exposure over [--from, --to] (default: last 30 days), newest first."""
+    from database import view_historical_performance
+    from timeseries import SERIES_COLUMNS
+
+    history = view_historical_performance(args.start, args.end)
+    rows = [dict(zip(["date", *SERIES_COLUMNS], row)) for row in history]
+    return rows, rows
+
+
+def cmd_import(args):
+    """Bulk-loads a broker tradebook or CAS statement."""
+    import importer
+
+    try:
+        stats = importer.run(args)
+    except (OSError, ValueError) as e:
+        sys.exit(f"❌ Import failed: {e}")
+    return stats, [stats]
+
+
+def cmd_record(args):
+    """Records a sell, dividend or split in the transactions ledger and reports the resulting position."""
+    import ledger
+
+    try:
+        book = ledger.record(args.kind, args.symbol.upper(), args.date, units=args.units or args.ratio or 0,
+                             price=args.price or 0, amount=args.amount or 0)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    row = {"symbol": args.symbol.upper(), "kind": args.kind, "date": args.date,
+           "units_held": book.units, "cost": book.cost, "realized": book.realized, "dividends": book.dividends}
+    return row, [row]
+
+
+def cmd_pnl(args):
+    """Realized and unrealized P&L per symbol from the transactions ledger."""
+    from ledger import profit_and_loss
+
+    rows, totals = profit_and_loss(args.as_of, args.method, args.since)
+    return {"totals": totals, "positions": rows}, rows
+
+
+def cmd_returns(args):
+    """XIRR per holding and for the portfolio, plus the time-weighted return over [--from, --to]."""
+    from returns import holding_returns, time_weighted_return
+
+    rows, portfolio = holding_returns(args.as_of)
+    twr = time_weighted_return(args.start, args.end or args.as_of)
+    return {"portfolio": portfolio, "time_weighted": twr, "holdings": rows}, rows
+
+
+def cmd_goals(args):
+    """Per-goal invested amount, actual XIRR and the return still required to reach the target."""
+    from returns import goal_returns
+
+    rows = goal_returns(args.as_of)
+    return rows, rows
+
+
+def cmd_simulate(args):
+    """Monte Carlo probability of each goal reaching its target, with the spread of final values."""
+    from simulation import simulate_goals
+
+    try:
+        rows = simulate_goals(args.goal_ids or None, paths=args.paths, seed=args.seed, workers=args.workers,
+                              mu=args.mu, sigma=args.sigma)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    return rows, rows
+
+
+def cmd_risk(args):
+    """Volatility, VaR, drawdown, beta and correlations of the current holdings."""
+    from risk import portfolio_risk, window_start
+
+    if args.benchmark:
+        from bar_cache import get_bars
+        get_bars(args.benchmark, window_start(args.window))  # Tops up the cached history; uses the cache when offline
+    rows, summary = portfolio_risk(args.window, args.benchmark or None)
+    return {"portfolio": summary, "holdings": rows}, rows
+
+
+def cmd_goal_value(args):
+    from database import set_goal_value
+
+    if not set_goal_value(args.goal_id, args.value, args.date):
+        sys.exit(f"❌ Goal {args.goal_id} not found")
+    row = {"id": args.goal_id, "current_value": args.value, "valued_on": args.date}
+    return row, [row]
+
+
+def cmd_update_sectors(args):
+    import update_sectors
+    update_sectors.run(args)
+
+
+def cmd_ingest_navs(args):
+    import amfi
+    source = args.file or amfi.AMFI_NAV_URL
+    try:
+        amfi.ingest_nav_file(source)
+    except OSError as e:  # Missing/unreadable file, or a failed download
+        sys.exit(f"❌ Could not read {source}: {e}")
+
+
+def cmd_backfill_navs(args):
+    import nav_history
+    nav_history.backfill_nav_history(args.codes or None)
+
+
+def iso_date(value):
+    datetime.date.fromisoformat(value)  # Reject bad dates up front with a clear argparse error
+    return value
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def build_parser():
+    import importer
+    import update_sectors
+
+    parser = argparse.ArgumentParser(description="Portfolio manager (interactive menu when run without a command).")
+    parser.add_argument("--provider", help="market data source: live (default), record:<dir> or replay:<dir>")
+    parser.add_argument("--profile", action="store_true", help="print a per-stage timing breakdown after each action")
+    parser.add_argument("--profile-out", metavar="PATH", help="also write a cProfile file per action (implies --profile)")
+    commands = parser.add_subparsers(dest="command")
+
+    def add(name, handler, help, output=True):
+        command = commands.add_parser(name, help=help, description=help)
+        command.set_defaults(handler=handler, output=output)
+        if output:
+            command.add_argument("--format", choices=["json", "csv"], default="json", help="output format (default: json)")
+        return command
+
+    add("refresh", cmd_refresh, "fetch and record today's price for every holding")
+    snapshot = add("snapshot", cmd_snapshot, "fill missing portfolio_history snapshots from stored prices")
+    snapshot.add_argument("--from", dest="start", type=iso_date, help="first day to check (default: after the latest snapshot)")
+    snapshot.add_argument("--to", dest="end", type=iso_date, help="last day to check (default: today)")
+    value = add("value", cmd_value, "value every holding with portfolio totals")
+    value.add_argument("--stored", action="store_true", help="use the last stored prices instead of fetching live ones")
+    add("insights", cmd_insights, "industry and geographic allocation of stocks")
+    history = add("history", cmd_history, "daily portfolio performance over a date range")
+    history.add_argument("--from", dest="start", type=iso_date, help="start date (default: 30 days before --to)")
+    history.add_argument("--to", dest="end", type=iso_date, help="end date (default: today)")
+
+    sell = add("sell", cmd_record, "record a sale in the ledger and close portfolio lots oldest first")
+    sell.add_argument("symbol")
+    sell.add_argument("--units", type=float, required=True)
+    sell.add_argument("--price", type=float, required=True, help="sale price per unit")
+    dividend = add("dividend", cmd_record, "record a cash dividend in the transactions ledger")
+    dividend.add_argument("symbol")
+    dividend.add_argument("--amount", type=float, required=True, help="total cash received")
+    split = add("split", cmd_record, "record a stock split or bonus in the transactions ledger")
+    split.add_argument("symbol")
+    split.add_argument("--ratio", type=float, required=True, help="new units per old unit (2 for a 2:1 split)")
+    for command, kind in ((sell, "SELL"), (dividend, "DIVIDEND"), (split, "SPLIT")):
+        command.add_argument("--date", type=iso_date, default=datetime.date.today().isoformat(),
+                             help="transaction date (default: today)")
+        command.set_defaults(kind=kind, units=None, price=None, amount=None, ratio=None)
+    pnl = add("pnl", cmd_pnl, "realized and unrealized P&L from the transactions ledger")
+    pnl.add_argument("--as-of", type=iso_date, help="day to report on (default: today)")
+    pnl.add_argument("--since", type=iso_date, help="only count realized P&L and dividends from this day")
+    pnl.add_argument("--method", choices=["fifo", "average"], default="fifo", help="lot matching (default: fifo)")
+
+    returns = add("returns", cmd_returns, "XIRR per holding and for the portfolio, and time-weighted return")
+    returns.add_argument("--as-of", type=iso_date, help="valuation day (default: today)")
+    returns.add_argument("--from", dest="start", type=iso_date, help="time-weighted return start (default: first snapshot)")
+    returns.add_argument("--to", dest="end", type=iso_date, help="time-weighted return end (default: --as-of)")
+    goals = add("goals", cmd_goals, "actual and required returns for every goal")
+    goals.add_argument("--as-of", type=iso_date, help="count contributions up to this day (default: today)")
+    simulate = add("simulate", cmd_simulate, "Monte Carlo probability of reaching each goal")
+    simulate.add_argument("goal_ids", type=int, nargs="*", help="goals to simulate (default: all)")
+    simulate.add_argument("--paths", type=positive_int, default=100000, help="simulated paths per goal (default: 100000)")
+    simulate.add_argument("--seed", type=int, help="random seed for a reproducible run")
+    simulate.add_argument("--workers", type=positive_int, default=1, help="worker processes (helps from ~100k paths)")
+    simulate.add_argument("--mu", type=float, help="annual log-return drift (default: estimated from price history)")
+    simulate.add_argument("--sigma", type=float, help="annual volatility (default: estimated from price history)")
+    risk = add("risk", cmd_risk, "volatility, VaR, drawdown, beta and correlations of the holdings")
+    risk.add_argument("--window", type=int, default=252, help="trading days of returns to use (default: 252)")
+    risk.add_argument("--benchmark", default="^NSEI", help="index for beta, cached in ohlc_bars (default: ^NSEI; '' to skip)")
+    goal_value = add("goal-value", cmd_goal_value, "record a goal's current value")
+    goal_value.add_argument("goal_id", type=int)
+    goal_value.add_argument("value", type=float)
+    goal_value.add_argument("--date", type=iso_date, default=datetime.date.today().isoformat(),
+                            help="valuation date (default: today)")
+
+    importer.add_arguments(add("import", cmd_import, "bulk import a tradebook or CAS statement (CSV, XLSX or JSON)"))
+    update_sectors.add_arguments(add("update-sectors", cmd_update_sectors, "backfill missing sector/industry info", False))
+    ingest = add("ingest-navs", cmd_ingest_navs, "load today's NAVs for held mutual funds from the AMFI NAV file", False)
+    ingest.add_argument("--file", help="local NAVAll.txt path or URL (default: AMFI)")
+    navs = add("backfill-navs", cmd_backfill_navs, "store the full mfapi NAV history of mutual funds", False)
+    navs.add_argument("codes", nargs="*", help="scheme codes (default: every held mutual fund)")
+    return parser
+
+
+def run(argv=None, interactive=None):
+    """Parses argv and runs one subcommand, or `interactive()` when no command is given."""
+    args = build_parser().parse_args(argv)
+    if args.profile or args.profile_out:
+        instrumentation.enable(args.profile_out)
+    if args.provider:
+        from providers import provider_from_spec, set_provider
+        set_provider(provider_from_spec(args.provider))
+
+    if not args.command:
+        if interactive:
+            interactive()
+        return
+
+    # Progress and warning prints go to stderr so stdout carries only the JSON/CSV output
+    with contextlib.redirect_stdout(sys.stderr), instrumentation.action(args.command):
+        result = args.handler(args)
+    if args.output:
+        emit(*result, args.format)
@@ -1,21 +1,28 @@
 import os
-from dotenv import load_dotenv
+from functools import lru_cache
 
-# ✅ Load environment variables
-load_dotenv()
+# Keys for optional LLM features. Nothing reads them at import time, so the
+# app starts without a .env; a missing key only fails the feature that needs it.
+API_KEYS = ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GEMINI_API_KEY")
 
-# ✅ Debug: Print environment variables to check if they're loaded
-#print(f"DEBUG: OPENAI_API_KEY={os.getenv('OPENAI_API_KEY')}")
-#print(f"DEBUG: ANTHROPIC_API_KEY={os.getenv('ANTHROPIC_API_KEY')}")
-#print(f"DEBUG: GEMINI_API_KEY={os.getenv('GEMINI_API_KEY')}")
 
-# ✅ Assign API keys
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+@lru_cache(maxsize=None)
+def _load_env():
+    from dotenv import load_dotenv
+    load_dotenv()
 
-# ✅ Ensure they are loaded
-if not OPENAI_API_KEY or not ANTHROPIC_API_KEY or not GEMINI_API_KEY:
-    raise ValueError("🚨 API keys are missing! Make sure the .env file is correctly configured.")
 
-#print("✅ API keys loaded successfully!")
\ No newline at end of file
+def get_api_key(name):
+    """Returns an API key from the environment (loading .env on first use); raises if it isn't configured."""
+    _load_env()
+    key = os.getenv(name)
+    if not key:
+        raise ValueError(f"🚨 {name} is missing! Make sure the .env file is correctly configured.")
+    return key
+
+
+def __getattr__(name):
+    # `from config import OPENAI_API_KEY` keeps working, resolved lazily
+    if name in API_KEYS:
+        return get_api_key(name)
+    raise AttributeError(f"module 'config' has no attribute {name!r}")
@@ -2,146 +2,72 @@ import sqlite3
 from rich.console import Console
 
 console = Console()
-import yfinance as yf
-from rich.progress import Progress
-from fetch_data import get_stock_name, get_mutual_fund_name  # ✅ Import from new file
 
 import sqlite3
+from db import get_connection
+from migrations import migrate
+from snapshots import backfill, apply_lot_change
+
+# Everything that pulls in pandas, yfinance or requests is imported inside the
+# function that needs it, so startup (initialize_db + menu) stays fast
 
 
 def initialize_db():
-    """Creates the database and tables with correct schema."""
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-    
-    # First create tables if they don't exist
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS portfolio (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            investment_type TEXT NOT NULL CHECK(investment_type IN ('Stock', 'Mutual Fund')),
-            symbol TEXT NOT NULL,
-            name TEXT,
-            purchase_date TEXT NOT NULL,
-            purchase_price REAL NOT NULL,
-            units REAL NOT NULL,
-            currency TEXT NOT NULL
-        )
-    """)
-
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS portfolio_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            total_value REAL NOT NULL,
-            total_cost REAL NOT NULL,
-            profit_loss REAL NOT NULL,
-            inr_exposure REAL NOT NULL,
-            usd_exposure REAL NOT NULL,
-            UNIQUE(date) ON CONFLICT REPLACE
-        )
-    """)
-
-    # Calculate and store portfolio snapshot
-    today = datetime.datetime.today().strftime("%Y-%m-%d")
+    """Brings the database schema up to date and fills any missing portfolio snapshots, offline."""
+    conn = get_connection()
+    migrate(conn)  # No-op once the schema is current
     
-    # Calculate total portfolio value and exposures
-    cursor.execute("""
-        SELECT p.symbol, p.investment_type, p.purchase_price, p.units, p.currency, ph.price
-        FROM portfolio p
-        LEFT JOIN (
-            SELECT symbol, price 
-            FROM price_history 
-            WHERE date = ?
-        ) ph ON p.symbol = ph.symbol
-    """, (today,))
-    
-    investments = cursor.fetchall()
-    
-    total_value = 0
-    total_cost = 0
-    inr_exposure = 0
-    usd_exposure = 0
-    usd_rate = get_usd_to_inr()
-    
-    for symbol, inv_type, buy_price, units, currency, current_price in investments:
-        if current_price is None:
-            continue
-            
-        cost = buy_price * units
-        value = current_price * units
-        
-        if currency == "USD":
-            cost *= usd_rate
-            value *= usd_rate
-            usd_exposure += value
-        else:
-            inr_exposure += value
-            
-        total_cost += cost
-        total_value += value
-    
-    profit_loss = total_value - total_cost
-    
-    # Store the snapshot
-    cursor.execute("""
-        INSERT INTO portfolio_history 
-        (date, total_value, total_cost, profit_loss, inr_exposure, usd_exposure)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (today, total_value, total_cost, profit_loss, inr_exposure, usd_exposure))
-    
-    conn.commit()
-    conn.close()
+    # Snapshots are kept current incrementally; only fill days that landed since the last one
+    backfill(conn)
+
 
 def add_investment(investment_type, symbol, purchase_date, purchase_price, units, currency):
     """Adds a stock or mutual fund entry into the database with a proper name, sector, and industry."""
-    conn = sqlite3.connect("portfolio.db")
+    from ledger import record_transactions
+    from securities import get_security, lot_currency
+
+    conn = get_connection()
     cursor = conn.cursor()
 
     name, sector, industry = "Unknown", "N/A", "N/A"  # Default values
 
     # Determine currency based on investment type and symbol
-    if investment_type == "Mutual Fund":
-        currency = "INR"  # All mutual funds are in INR
-        name = get_mutual_fund_name(symbol)
-    else:  # For stocks
-        currency = "INR" if (symbol.endswith(".NS") or symbol.endswith(".BO")) else "USD"
-        name = get_stock_name(symbol)
-        
-        # Fetch additional stock info using yfinance
-        try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            sector = info.get('sector', 'N/A')
-            industry = info.get('industry', 'N/A')
-            if not name:  # If name wasn't fetched earlier
-                name = info.get('longName', 'Unknown')
-        except Exception as e:
-            print(f"⚠️ Could not fetch additional info for {symbol}: {e}")
+    currency = lot_currency(investment_type, symbol)
+
+    # Name, sector and industry come from the securities cache: one provider call the first time, none after
+    security = get_security(symbol, investment_type)
+    if security:
+        name = security["name"]
+        if investment_type == "Stock":
+            sector, industry = security["sector"], security["industry"]
+    else:
+        print(f"⚠️ Could not fetch additional info for {symbol}")
 
     if not name:
         name = "Unknown"
 
-    cursor.execute("""
-        INSERT INTO portfolio (investment_type, symbol, name, sector, industry, purchase_date, purchase_price, units, currency)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (investment_type, symbol, name, sector, industry, purchase_date, purchase_price, units, currency))
-    conn.commit()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO portfolio (investment_type, symbol, name, sector, industry, purchase_date, purchase_price, units, currency)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (investment_type, symbol, name, sector, industry, purchase_date, purchase_price, units, currency))
+        record_transactions(conn, [(purchase_date, symbol, investment_type, "BUY", units, purchase_price, 0,
+                                    currency, cursor.lastrowid, None)])
+        apply_lot_change(conn, symbol, purchase_date, purchase_price, units, currency)
     print(f"✅ {investment_type} {symbol} ({currency}) added successfully! Name: {name}")
 
 def view_portfolio():
-    conn = sqlite3.connect("portfolio.db")
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id, investment_type, symbol, name, sector, industry, purchase_date, purchase_price, units, currency FROM portfolio")
     records = cursor.fetchall()
-    conn.close()
     return records
 
 def delete_investment():
-    """Deletes a stock or mutual fund from the portfolio."""
-    conn = sqlite3.connect("portfolio.db")
+    """Deletes a stock or mutual fund from the portfolio (for entries added by mistake; record sales in the ledger)."""
+    from ledger import remove_lot
+
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Show all investments before asking for deletion
@@ -150,7 +76,6 @@ def delete_investment():
 
     if not records:
         print("📭 No investments found in your portfolio.")
-        conn.close()
         return
 
     # Display investments
@@ -160,95 +85,65 @@ def delete_investment():
 
     try:
         delete_id = int(input("\n🗑 Enter the ID of the stock or mutual fund to delete: ").strip())
-        cursor.execute("DELETE FROM portfolio WHERE id = ?", (delete_id,))
-        conn.commit()
-
-        if cursor.rowcount > 0:
-            print(f"✅ Investment ID {delete_id} deleted successfully!")
-        else:
-            print(f"⚠️ Investment ID {delete_id} not found.")
     except ValueError:
         print("❌ Invalid input. Please enter a valid numeric ID.")
+        return
+
+    try:
+        with conn:
+            deleted = remove_lot(conn, delete_id)
+    except ValueError as e:  # The ledger would drift from the portfolio; nothing was deleted
+        print(f"❌ {e}")
+        return
 
-    conn.close()
+    if deleted:
+        print(f"✅ Investment ID {delete_id} deleted successfully!")
+    else:
+        print(f"⚠️ Investment ID {delete_id} not found.")
 
-import yfinance as yf
 
 def get_live_price(stock_symbol, currency):
     """Fetches the latest stock price with a loading indicator."""
+    from rich.progress import Progress
+    from providers import get_provider
+
     try:
         with Progress() as progress:
             task = progress.add_task("[cyan]Fetching price...", total=100)
-            stock = yf.Ticker(stock_symbol)
-            stock_info = stock.history(period="1d")
+            live_price = get_provider().get_quotes([stock_symbol]).get(stock_symbol)
 
-            if stock_info.empty:
+            if live_price is None:
                 console.print(f"[bold red]⚠️ Stock {stock_symbol} is invalid or delisted.[/]")
                 return None
 
             progress.update(task, completed=100)
-            live_price = round(stock_info["Close"].iloc[-1], 2)
-            
-            return live_price
+            return round(live_price, 2)
     except Exception as e:
         console.print(f"[bold red]⚠️ Error fetching live price for {stock_symbol}: {e}[/]")
         return None
 
-import requests
+from fx import get_rate
 
-def get_usd_to_inr():
-    """Fetches the latest USD to INR conversion rate from an API."""
-    try:
-        response = requests.get("https://api.exchangerate-api.com/v4/latest/USD")
-        data = response.json()
-        return round(data["rates"]["INR"], 2)  # Returns exchange rate (e.g., 83.50)
-    except Exception as e:
-        console.print(f"[bold red]⚠️ Error fetching USD to INR conversion rate: {e}[/]")
-        return 83.0  # Default fallback rate
+def get_usd_to_inr(date=None):
+    """Returns the USD to INR rate (today's, or the one in effect on `date`) via the cached FX service."""
+    return get_rate("USD", "INR", date)
 
 def get_portfolio_insights():
     """Calculates portfolio insights including industry and geographic allocation."""
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-    
-    # Get all stocks with their current values
-    cursor.execute("""
-        SELECT p.symbol, p.industry, p.units, p.currency, ph.price 
-        FROM portfolio p
-        LEFT JOIN (
-            SELECT symbol, price 
-            FROM price_history 
-            WHERE (symbol, date) IN (
-                SELECT symbol, MAX(date) 
-                FROM price_history 
-                GROUP BY symbol
-            )
-        ) ph ON p.symbol = ph.symbol
-        WHERE p.investment_type = 'Stock'
-    """)
-    
-    stocks = cursor.fetchall()
-    conn.close()
-    
-    # Calculate total portfolio value and industry allocations
-    industry_values = {}
-    total_portfolio_value = 0
+    from valuation import load_holdings, load_prices, value_holdings, allocation
+
+    conn = get_connection()
     
-    for symbol, industry, units, currency, price in stocks:
-        if price:  # Skip if no price available
-            value = units * price
-            if currency == "USD":
-                value *= get_usd_to_inr()  # Convert to INR
-                
-            industry = industry if industry != "N/A" else "Other"
-            industry_values[industry] = industry_values.get(industry, 0) + value
-            total_portfolio_value += value
+    # Value all stocks at their latest price
+    stocks = load_holdings(conn, "Stock")
+    usd_rate = get_usd_to_inr() if (stocks["currency"] == "USD").any() else 1
+    valued = value_holdings(stocks, load_prices(conn), usd_rate)
+    valued["industry"] = valued["industry"].fillna("Other").replace("N/A", "Other")
     
     # Calculate percentages and check for over-exposure
     allocations = []
     warnings = []
-    for industry, value in industry_values.items():
-        percentage = (value / total_portfolio_value * 100) if total_portfolio_value > 0 else 0
+    for industry, value, percentage in allocation(valued, "industry"):
         risk_level = ""
         if percentage > 60:
             risk_level = "⚠️ HIGH RISK"
@@ -263,22 +158,10 @@ def get_portfolio_insights():
         allocations.append((industry, value, percentage, risk_level))
     
     # Calculate geographic exposure
-    geographic_values = {"INR": 0, "USD": 0}
-    for symbol, industry, units, currency, price in stocks:
-        if price:
-            value = units * price
-            if currency == "USD":
-                value_inr = value * get_usd_to_inr()
-                geographic_values["USD"] += value_inr
-            else:
-                geographic_values["INR"] += value
-
-    total_geo_value = geographic_values["INR"] + geographic_values["USD"]
-    geographic_allocation = []
-    for currency, value in geographic_values.items():
-        if total_geo_value > 0:
-            percentage = (value / total_geo_value) * 100
-            geographic_allocation.append((currency, value, percentage))
+    geographic_allocation = allocation(valued, "currency")
+    if geographic_allocation:
+        present = {currency for currency, _, _ in geographic_allocation}
+        geographic_allocation += [(currency, 0.0, 0.0) for currency in ("INR", "USD") if currency not in present]
 
     return (
         sorted(allocations, key=lambda x: x[2], reverse=True),  # Industry allocations
@@ -292,7 +175,7 @@ def get_portfolio_insights():
 
 def insert_sample_goals():
     """Inserts sample goals and investments for testing."""
-    conn = sqlite3.connect("portfolio.db")
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Sample goals
@@ -315,43 +198,50 @@ def insert_sample_goals():
     ])
 
     conn.commit()
-    conn.close()
     console.print("✅ Sample goals and investments inserted successfully!")
 
+def set_goal_value(goal_id, value, valued_on=None):
+    """Records a goal's current value (as of `valued_on`, default today) so its actual XIRR can be computed."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("UPDATE goals SET current_value = ?, valued_on = ? WHERE id = ?",
+                              (value, valued_on or datetime.date.today().isoformat(), goal_id))
+    return cursor.rowcount > 0
+
+
 def get_historical_price(stock_symbol, period="1mo"):
-    """Fetches historical stock price data for the given period."""
+    """Fetches historical closing prices for the given period, from the local bar cache where possible."""
+    from bar_cache import get_close_history
+
     try:
-        stock = yf.Ticker(stock_symbol)
-        history = stock.history(period=period)
+        history = get_close_history(stock_symbol, period)
 
         if history.empty:
             console.print(f"[bold red]⚠️ No historical data found for {stock_symbol}.[/]")
             return None
 
-        return history["Close"]  # Returns the closing price series
+        return history  # Returns the closing price series
     except Exception as e:
         console.print(f"[bold red]⚠️ Error fetching historical prices for {stock_symbol}: {e}[/]")
         return None
 
 def get_mutual_fund_nav(symbol):
     """Fetches the latest Mutual Fund NAV from AMFI (India Mutual Fund API)."""
-    try:
-        url = "https://api.mfapi.in/mf/" + symbol
-        response = requests.get(url)
-        data = response.json()
+    from amfi import get_scheme
+    from providers import get_provider
 
-        if "data" in data and data["data"]:
-            latest_nav = float(data["data"][0]["nav"])
-            return latest_nav
-        else:
-            return None  # If NAV not found
+    scheme = get_scheme(symbol)  # Free if a recent AMFI NAV file was ingested
+    if scheme:
+        return scheme[1]
+    try:
+        return get_provider().get_nav(symbol)
     except Exception as e:
         print(f"⚠️ Error fetching NAV for {symbol}: {e}")
         return None
 
 def insert_sample_data():
     """Adds sample stocks & mutual funds for testing."""
-    conn = sqlite3.connect("portfolio.db")
+    conn = get_connection()
     cursor = conn.cursor()
 
     sample_data = [
@@ -373,130 +263,51 @@ def insert_sample_data():
     """, sample_data)
 
     conn.commit()
-    conn.close()
     print("✅ Sample data inserted successfully!")
 
 def create_price_history_table():
     """Creates a table to track price changes over time for investments."""
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT NOT NULL,
-            date TEXT NOT NULL,
-            price REAL NOT NULL
-        )
-    """)
-
-    conn.commit()
-    conn.close()
+    migrate(get_connection())
     print("✅ Price history table created!")
 
-import yfinance as yf
 import datetime
 
-def update_price_history():
-    """Fetches the latest price for all stocks & mutual funds and updates history."""
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+def update_price_history(provider=None):
+    """Fetches the latest price for all stocks & mutual funds and updates history in one batch."""
+    from price_refresh import refresh_prices
 
-    # Ensure tables exist
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT NOT NULL,
-            date TEXT NOT NULL,
-            price REAL NOT NULL,
-            UNIQUE(symbol, date) ON CONFLICT REPLACE
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS portfolio_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            total_value REAL NOT NULL,
-            total_cost REAL NOT NULL,
-            profit_loss REAL NOT NULL,
-            inr_exposure REAL NOT NULL,
-            usd_exposure REAL NOT NULL,
-            UNIQUE(date) ON CONFLICT REPLACE
-        )
-    """)
-    cursor.execute("SELECT symbol, investment_type FROM portfolio")
-    records = cursor.fetchall()
+    conn = get_connection()
+    cursor = conn.cursor()
 
     today = datetime.datetime.today().strftime("%Y-%m-%d")
+    usd_rate = get_usd_to_inr()  # Also stores today's rate for offline snapshot rebuilds
+
+    for symbol, latest_price, last_price in refresh_prices(conn, provider, today, usd_rate=usd_rate):
+        # Determine price change indicator with color
+        if last_price is not None:
+            if latest_price > last_price:
+                indicator = "\033[92m🔼\033[0m"  # Green up arrow
+            elif latest_price < last_price:
+                indicator = "\033[91m🔽\033[0m"  # Red down arrow
+            else:
+                indicator = "⚫"  # Neutral dot
+        else:
+            indicator = "🆕"  # New entry
 
-    for symbol, investment_type in records:
-        try:
-            # Get the price based on investment type
-            if investment_type == "Mutual Fund" and symbol.isdigit():
-                latest_price = get_mutual_fund_nav(symbol)
-                if latest_price is None:
-                    print(f"⚠️ No NAV data for {symbol}, skipping...")
-                    continue
-            else:  # Stock
-                stock = yf.Ticker(symbol)
-                hist = stock.history(period="1d")
-                if hist.empty:
-                    print(f"⚠️ No price data for {symbol}, skipping...")
-                    continue
-                latest_price = hist["Close"].iloc[-1]
-                # No currency conversion here - just return the raw price
-
-            if latest_price:
-                # Get the last recorded price
-                cursor.execute("""
-                    SELECT price FROM price_history 
-                    WHERE symbol = ? 
-                    ORDER BY date DESC LIMIT 1
-                """, (symbol,))
-                last_price = cursor.fetchone()
-
-                # Determine price change indicator with color
-                if last_price:
-                    last_price = last_price[0]
-                    if latest_price > last_price:
-                        indicator = "\033[92m🔼\033[0m"  # Green up arrow
-                    elif latest_price < last_price:
-                        indicator = "\033[91m🔽\033[0m"  # Red down arrow
-                    else:
-                        indicator = "⚫"  # Neutral dot
-                else:
-                    indicator = "🆕"  # New entry
-
-                cursor.execute("""
-                    REPLACE INTO price_history (symbol, date, price) VALUES (?, ?, ?)
-                """, (symbol, today, latest_price))
-
-                print(f"✅ Recorded {symbol} price: {round(latest_price, 2)} {indicator} on {today}")
-        except Exception as e:
-            print(f"⚠️ Error fetching price for {symbol}: {e}")
+        print(f"✅ Recorded {symbol} price: {round(latest_price, 2)} {indicator} on {today}")
 
-    conn.commit()
-    conn.close()
 
-def view_historical_performance():
-    """Retrieves historical portfolio performance data."""
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT 
-            date,
-            total_value,
-            total_cost,
-            profit_loss,
-            inr_exposure,
-            usd_exposure
-        FROM portfolio_history
-        ORDER BY date DESC
-        LIMIT 30   
-    """)
-    
-    history = cursor.fetchall()
-    conn.close()
-    return history
+def view_historical_performance(start_date=None, end_date=None):
+    """Rebuilds daily portfolio performance for [start_date, end_date] (default: the last 30 days), newest first."""
+    from timeseries import portfolio_timeseries, SERIES_COLUMNS
+
+    end_date = end_date or datetime.date.today().isoformat()
+    start_date = start_date or (datetime.date.fromisoformat(end_date) - datetime.timedelta(days=29)).isoformat()
+
+    series = portfolio_timeseries(get_connection(), start_date, end_date)
+    series = series[(series["total_value"] != 0) | (series["total_cost"] != 0)]  # Days before anything was held/priced
+
+    return [
+        (date.strftime("%Y-%m-%d"), *values)
+        for date, values in zip(series.index[::-1], series[SERIES_COLUMNS].to_numpy()[::-1].tolist())
+    ]
@@ -0,0 +1,106 @@
+import atexit
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+import instrumentation
+from migrations import migrate
+
+DB_PATH = os.getenv("PORTFOLIO_DB", "portfolio.db")
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",       # Readers don't block the writer and vice versa
+    "PRAGMA synchronous = NORMAL",     # Safe with WAL, far fewer fsyncs
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",      # ~16 MB page cache
+    "PRAGMA mmap_size = 134217728",    # 128 MB memory-mapped reads
+)
+
+_local = threading.local()
+_connections = []          # Open connections of live threads, for close_all()
+_generation = 0            # Bumped by close_all() so other threads reopen
+_migrated = set()          # Paths already brought up to the current schema this process
+_lock = threading.Lock()
+
+
+def _open(path):
+    factory = instrumentation.TimedConnection if instrumentation.ENABLED else sqlite3.Connection
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, factory=factory)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if path not in _migrated:
+        migrate(conn)
+        _migrated.add(path)
+    return conn
+
+
+class _ThreadConnection:
+    """Holds a thread's connection in `_local`; when the thread exits and drops it, the connection is closed."""
+
+    def __init__(self, conn, generation):
+        self.conn, self.generation = conn, generation
+        weakref.finalize(self, _release, conn)
+
+
+def _release(conn):
+    with _lock:
+        if conn in _connections:
+            _connections.remove(conn)
+    try:
+        conn.close()
+    except sqlite3.ProgrammingError:
+        pass
+
+
+def get_connection():
+    """Returns this thread's shared connection to the portfolio database, opening it on first use.
+
+    Each thread gets its own long-lived connection, so repeated calls cost nothing
+    and worker threads can write concurrently (WAL + busy timeout) without
+    `database is locked` errors. It is closed when the thread exits; callers
+    must not close it themselves (use close_all()).
+    """
+    holder = getattr(_local, "holder", None)
+    if holder is None or holder.generation != _generation:
+        conn = _open(DB_PATH)
+        with _lock:
+            _connections.append(conn)
+        _local.holder = _ThreadConnection(conn, _generation)  # Outside the lock: replacing a holder releases it
+        return conn
+    return holder.conn
+
+
+@contextmanager
+def transaction():
+    """Yields the shared connection inside a transaction that commits on success and rolls back on error."""
+    conn = get_connection()
+    with conn:
+        yield conn
+
+
+def set_db_path(path):
+    """Points every subsequent get_connection() call at a different database file."""
+    global DB_PATH
+    close_all()
+    DB_PATH = path
+
+
+def close_all():
+    """Closes every connection handed out so far (called automatically at exit)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+        _connections.clear()
+
+
+atexit.register(close_all)
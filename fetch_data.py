@@ -1,28 +1,24 @@
-import yfinance as yf
-import requests
+from amfi import get_scheme
+from securities import get_security
 
 
 def get_stock_name(symbol):
-    """Fetch the full company name for a stock symbol from Yahoo Finance."""
+    """Fetch the full company name for a stock symbol (cached in the securities table)."""
     try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
-        return info.get("longName", None)  # Returns the full stock name if available
+        security = get_security(symbol, "Stock")
+        return security["name"] if security else None  # Returns the full stock name if available
     except Exception as e:
         print(f"⚠️ Error fetching Stock name for {symbol}: {e}")
         return None
 
 def get_mutual_fund_name(symbol):
-    """Fetch the full mutual fund name from AMFI API based on scheme code."""
+    """Fetch the full mutual fund name from AMFI based on scheme code (cached in the securities table)."""
     try:
-        url = f"https://api.mfapi.in/mf/{symbol}"
-        response = requests.get(url)
-        data = response.json()
-
-        if "meta" in data and "scheme_name" in data["meta"]:
-            return data["meta"]["scheme_name"]  # Returns full mutual fund name
-        else:
-            return None
+        scheme = get_scheme(symbol)  # Free if a recent AMFI NAV file was ingested
+        if scheme:
+            return scheme[0]
+        security = get_security(symbol, "Mutual Fund")
+        return security["name"] if security else None  # Returns full mutual fund name
     except Exception as e:
         print(f"⚠️ Error fetching Mutual Fund name for {symbol}: {e}")
         return None
\ No newline at end of file
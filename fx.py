@@ -0,0 +1,104 @@
+import bisect
+import datetime
+import threading
+import time
+
+from db import get_connection
+
+FX_TTL_SECONDS = 60 * 60   # Live rates are reused for an hour
+FALLBACK_USD_INR = 83.0    # Only used when no rate has ever been stored
+
+_cache = {}                # (base, quote) -> (rate, expires_at)
+_lock = threading.Lock()
+
+
+def _fetch_live(base, quote):
+    from providers import get_provider  # Deferred: keeps snapshot/startup paths free of HTTP imports
+
+    return get_provider().get_fx_rate(base, quote)
+
+
+def store_rate(base, quote, date, rate, fetched_at=None):
+    """Persists a rate for a given day (YYYY-MM-DD) in the fx_rates table."""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "REPLACE INTO fx_rates (base, quote, date, rate, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (base, quote, date, rate, fetched_at or time.time()),
+        )
+
+
+def get_stored_rate(base, quote, date=None):
+    """Returns (date, rate, fetched_at) of the latest stored rate on or before `date`, or None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT date, rate, fetched_at FROM fx_rates
+        WHERE base = ? AND quote = ? AND date <= ?
+        ORDER BY date DESC LIMIT 1
+    """, (base, quote, date or "9999-12-31"))
+    return cursor.fetchone()
+
+
+def load_rate_table(base="USD", quote="INR", conn=None):
+    """Returns (dates, rates) lists of every stored rate for a pair, oldest first, for bulk lookups."""
+    cursor = (conn or get_connection()).cursor()
+    cursor.execute("SELECT date, rate FROM fx_rates WHERE base = ? AND quote = ? ORDER BY date", (base, quote))
+    rows = cursor.fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def lookup_rate(table, date, fallback=FALLBACK_USD_INR):
+    """Finds the rate in effect on `date` in a load_rate_table() result, without touching the database."""
+    dates, rates = table
+    if not dates:
+        return fallback
+    index = bisect.bisect_right(dates, date) - 1
+    return rates[max(index, 0)]  # Before the first stored rate, use the earliest one
+
+
+def get_rate(base="USD", quote="INR", date=None, ttl=FX_TTL_SECONDS):
+    """Returns the base->quote rate, today's by default or the one in effect on `date`.
+
+    Today's rate is served from the in-process cache, then from a fresh row in
+    fx_rates, and only then from the network. Historical dates are answered from
+    fx_rates alone. If nothing is available the last stored rate is used, and the
+    hard-coded fallback only when no rate has ever been stored.
+    """
+    if base == quote:
+        return 1.0
+
+    today = datetime.date.today().isoformat()
+    if date and date < today:
+        stored = get_stored_rate(base, quote, date) or get_stored_rate(base, quote)
+        return stored[1] if stored else FALLBACK_USD_INR
+
+    key = (base, quote)
+    now = time.time()
+    with _lock:
+        cached = _cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        stored = get_stored_rate(base, quote)
+        if stored and stored[2] + ttl > now:
+            _cache[key] = (stored[1], stored[2] + ttl)
+            return stored[1]
+
+        try:
+            rate, rate_date = _fetch_live(base, quote)
+        except Exception as e:
+            print(f"⚠️ Error fetching {base} to {quote} conversion rate: {e}")
+            rate = stored[1] if stored else FALLBACK_USD_INR
+            _cache[key] = (rate, now + 60)  # Retry the network in a minute, not on every call
+            return rate
+
+        store_rate(base, quote, rate_date, rate, now)
+        _cache[key] = (rate, now + ttl)
+        return rate
+
+
+def clear_cache():
+    """Drops the in-process cache so the next lookup goes back to storage or the network."""
+    with _lock:
+        _cache.clear()
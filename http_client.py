@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+
+DEFAULT_TIMEOUT = 10        # Seconds to connect / between bytes; nothing waits forever
+DEFAULT_RETRIES = 3         # Extra attempts after the first, on connection errors, 429 and 5xx
+BACKOFF_SECONDS = 0.5       # First retry delay; doubles each attempt, with jitter
+POOL_SIZE = 16              # Keep-alive connections kept per host
+VALIDATOR_CACHE_SIZE = 256  # Most recently used URLs whose ETag/Last-Modified and parsed body are kept
+
+# Requests per second allowed per host (hosts not listed are unlimited)
+RATE_LIMITS = {
+    "api.mfapi.in": 10,
+    "api.exchangerate-api.com": 2,
+    "www.amfiindia.com": 1,
+}
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    """Shared HTTP layer for providers: one keep-alive session pool, per-host rate limits,
+    timeouts, retries with exponential backoff, ETag/Last-Modified revalidation and latency metrics."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=BACKOFF_SECONDS,
+                 rate_limits=None, pool_size=POOL_SIZE):
+        import requests  # Deferred until the first request: importing it costs ~100 ms of startup
+        from requests.adapters import HTTPAdapter
+
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self._transient_errors = (requests.ConnectionError, requests.Timeout)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.buckets = {host: TokenBucket(rate) for host, rate in (RATE_LIMITS if rate_limits is None else rate_limits).items()}
+        self._validators = OrderedDict()   # url -> (etag, last_modified, parsed body), least recently used first
+        self._stats = {}        # host -> counters and recent latencies
+        self._lock = threading.Lock()
+
+    def _record(self, host, latency=None, **counts):
+        with self._lock:
+            stats = self._stats.setdefault(host, {
+                "requests": 0, "errors": 0, "retries": 0, "not_modified": 0, "latencies": deque(maxlen=1000),
+            })
+            for key, amount in counts.items():
+                stats[key] += amount
+            if latency is not None:
+                stats["latencies"].append(latency)
+
+    def get(self, url, params=None, headers=None, stream=False, timeout=None):
+        """GETs a URL, retrying transient failures. Raises for the final error or non-2xx/304 status."""
+        host = urlsplit(url).hostname
+        bucket = self.buckets.get(host)
+        for attempt in range(self.retries + 1):
+            if bucket:
+                bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers, stream=stream,
+                                            timeout=timeout or self.timeout)
+            except self._transient_errors:
+                self._record(host, requests=1, errors=1)
+                if attempt == self.retries:
+                    raise
+            else:
+                self._record(host, time.perf_counter() - started, requests=1)
+                if response.status_code not in _RETRY_STATUSES or attempt == self.retries:
+                    if response.status_code != 304:
+                        response.raise_for_status()
+                    return response
+                self._record(host, errors=1)
+                retry_after = response.headers.get("Retry-After", "")
+                response.close()
+                if retry_after.isdigit():
+                    self._record(host, retries=1)
+                    time.sleep(min(int(retry_after), self.backoff * 2 ** self.retries))  # Never longer than the full backoff
+                    continue
+            self._record(host, retries=1)
+            time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def get_json(self, url, params=None, timeout=None):
+        """GETs and parses a JSON body, revalidating with ETag/If-Modified-Since when seen before.
+
+        A 304 reply costs no body transfer and returns the previously parsed body.
+        """
+        key = url if not params else f"{url}?{sorted(params.items())}"
+        with self._lock:
+            cached = self._validators.get(key)
+            if cached:
+                self._validators.move_to_end(key)
+        headers = {}
+        if cached:
+            if cached[0]:
+                headers["If-None-Match"] = cached[0]
+            if cached[1]:
+                headers["If-Modified-Since"] = cached[1]
+
+        response = self.get(url, params=params, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached:
+            self._record(urlsplit(url).hostname, not_modified=1)
+            return cached[2]
+
+        body = response.json()
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or last_modified:
+            with self._lock:
+                self._validators[key] = (etag, last_modified, body)
+                self._validators.move_to_end(key)
+                if len(self._validators) > VALIDATOR_CACHE_SIZE:
+                    self._validators.popitem(last=False)
+        return body
+
+    def metrics(self):
+        """Per-host request/error/retry/304 counts and latency percentiles (ms) over recent requests."""
+        with self._lock:
+            snapshot = {host: dict(stats, latencies=sorted(stats["latencies"])) for host, stats in self._stats.items()}
+        report = {}
+        for host, stats in snapshot.items():
+            latencies = stats.pop("latencies")
+            if latencies:
+                stats["p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 1)
+                stats["p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1)
+                stats["max_ms"] = round(latencies[-1] * 1000, 1)
+            report[host] = stats
+        return report
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the process-wide HttpClient, so every provider shares one connection pool."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def get_json(url, params=None, timeout=None):
+    """get_json() on the shared client."""
+    return get_client().get_json(url, params=params, timeout=timeout)
@@ -0,0 +1,428 @@
+import csv
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from db import get_connection
+from http_client import TokenBucket
+from ledger import close_lots, record_transactions
+from securities import fetch_metadata, get_cached_securities, lot_currency, store_security
+from snapshots import rebuild_dates
+
+CHUNK_ROWS = 5000           # Lots per executemany
+PROGRESS_EVERY = 10000      # Rows between progress lines
+JSON_CHUNK_CHARS = 1 << 16
+
+# Canonical field -> header names used by broker tradebooks (Zerodha, Groww, ...) and CAS exports (casparser)
+ALIASES = {
+    "symbol": ("symbol", "tradingsymbol", "ticker", "amfi", "amfi_code", "scheme_code"),
+    "investment_type": ("investment_type", "asset_type", "instrument_type"),
+    "date": ("date", "trade_date", "purchase_date", "transaction_date", "order_execution_time"),
+    "price": ("price", "purchase_price", "trade_price", "nav"),
+    "units": ("units", "quantity", "qty"),
+    "side": ("trade_type", "side", "transaction_type", "type", "buy_sell"),
+    "exchange": ("exchange",),
+    "trade_id": ("trade_id", "trade_ref"),
+    "folio": ("folio", "folio_number"),
+    "name": ("scheme", "scheme_name", "name"),
+}
+_HEADER = {alias: field for field, aliases in ALIASES.items() for alias in aliases}
+_FUND_CODE_HEADERS = {"amfi", "amfi_code", "scheme_code"}
+
+_BUY = ("buy", "purchase", "sip", "switch_in", "dividend_reinvest")
+_SELL = ("sell", "redemption", "switch_out")
+_SUFFIX = {"NSE": ".NS", "BSE": ".BO"}
+_DATE_FORMATS = ("%Y-%m-%d", "%d-%b-%Y", "%d-%m-%Y", "%d/%m/%Y", "%d-%b-%y", "%d %b %Y")
+
+
+class RowError(ValueError):
+    """A source row that can't become a lot (bad date, price or units)."""
+
+
+def _normalize_header(name):
+    return str(name or "").strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def _records(rows):
+    """Turns raw rows (lists) into canonical-field dicts, skipping any preamble before the header row."""
+    header = None
+    for row in rows:
+        if header is None:
+            names = [_normalize_header(cell) for cell in row]
+            fields = {_HEADER.get(name) for name in names}
+            if {"symbol", "date"} <= fields:
+                header = [(_HEADER.get(name), name in _FUND_CODE_HEADERS) for name in names]
+            continue
+        if not any(cell not in (None, "") for cell in row):
+            continue
+        record = {}
+        for (field, fund_code), cell in zip(header, row):
+            if field and record.get(field) in (None, ""):
+                record[field] = cell
+                if field == "symbol" and fund_code:
+                    record["investment_type"] = "Mutual Fund"
+        yield record
+    if header is None:
+        raise ValueError("No header row with a symbol and a date column found")
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        yield from _records(csv.reader(handle))
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Reading .xlsx files needs openpyxl (pip install openpyxl)") from None
+    workbook = load_workbook(path, read_only=True, data_only=True)  # Streams rows instead of loading the sheet
+    try:
+        yield from _records(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def _json_array(handle):
+    """Yields the elements of a top-level JSON array, decoding one element at a time."""
+    decoder = json.JSONDecoder()
+    buffer = handle.read(JSON_CHUNK_CHARS).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            more = handle.read(JSON_CHUNK_CHARS)
+            if not more:
+                raise
+            buffer += more
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def _cas_transactions(document):
+    """Flattens a casparser JSON statement into one record per scheme transaction."""
+    for folio in document.get("folios", []):
+        for scheme in folio.get("schemes", []):
+            for txn in scheme.get("transactions", []):
+                yield {
+                    "symbol": scheme.get("amfi"), "name": scheme.get("scheme"), "folio": folio.get("folio"),
+                    "investment_type": "Mutual Fund", "date": txn.get("date"), "price": txn.get("nav"),
+                    "units": txn.get("units"), "side": txn.get("type"),
+                }
+
+
+def _canonical(item):
+    record = {}
+    for key, value in item.items():
+        field = _HEADER.get(_normalize_header(key))
+        if field and record.get(field) in (None, ""):
+            record[field] = value
+            if field == "symbol" and _normalize_header(key) in _FUND_CODE_HEADERS:
+                record["investment_type"] = "Mutual Fund"
+    return record
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8-sig") as handle:
+        start = handle.read(1)
+        while start.isspace():
+            start = handle.read(1)
+        handle.seek(0)
+        if start == "[":
+            items = _json_array(handle)
+        else:
+            document = json.load(handle)  # CAS statements are one (small) nested object
+            items = _cas_transactions(document) if "folios" in document else document.get("trades", [])
+        for item in items:
+            yield _canonical(item)
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8-sig") as handle:
+        for line in handle:
+            if line.strip():
+                yield _canonical(json.loads(line))
+
+
+READERS = {
+    ".csv": _read_csv, ".txt": _read_csv,
+    ".xlsx": _read_xlsx, ".xlsm": _read_xlsx,
+    ".json": _read_json,
+    ".jsonl": _read_jsonl, ".ndjson": _read_jsonl,
+}
+
+
+def read_records(path):
+    """Streams canonical records (symbol, date, price, units, side, ...) from a CSV, XLSX or JSON file."""
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError(f"Unsupported file type: {path} (expected {', '.join(sorted(READERS))})")
+    return reader(path)
+
+
+def _parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    text = str(value or "").strip()
+    if len(text) >= 10 and text[4] == "-" and text[7] == "-":
+        text = text[:10]  # ISO date, possibly with a time part
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise RowError(f"bad date {value!r}")
+
+
+def _parse_number(value, field):
+    try:
+        return float(str(value).replace(",", "").strip()) if not isinstance(value, (int, float)) else float(value)
+    except ValueError:
+        raise RowError(f"bad {field} {value!r}") from None
+
+
+def _side(record):
+    """"buy", "sell", None for rows that aren't trades, or "" when the row doesn't say (sign of units decides)."""
+    side = _normalize_header(record.get("side"))
+    if not side:
+        return ""
+    if side in ("b", "s"):
+        return "buy" if side == "b" else "sell"
+    if side.startswith(_SELL):
+        return "sell"
+    if side.startswith(_BUY):
+        return "buy"
+    return None  # Charges, taxes, dividend payouts: not lots
+
+
+def to_lot(record, default_type=None):
+    """Validates one record and returns (side, lot) with lot = (type, symbol, date, price, units, currency, ref).
+
+    `side` is "buy", "sell" or None for rows that aren't trades. Raises RowError for unusable rows.
+    """
+    symbol = str(record.get("symbol") or "").strip().upper()
+    if not symbol:
+        raise RowError("missing symbol")
+    if symbol.endswith(".0") and symbol[:-2].isdigit():
+        symbol = symbol[:-2]  # Scheme codes read from spreadsheets as numbers
+    investment_type = record.get("investment_type") or default_type
+    if investment_type not in ("Stock", "Mutual Fund"):
+        investment_type = "Mutual Fund" if symbol.isdigit() else "Stock"
+    side = _side(record)
+    if side is None:
+        return None, None
+
+    date = _parse_date(record.get("date"))
+    price = _parse_number(record.get("price"), "price")
+    units = _parse_number(record.get("units"), "units")
+    side = side or ("sell" if units < 0 else "buy")
+    units = abs(units)
+    if price <= 0 or units == 0:
+        raise RowError(f"non-positive price or units ({price}, {units})")
+
+    exchange = str(record.get("exchange") or "").strip().upper()
+    if investment_type == "Stock" and "." not in symbol and exchange in _SUFFIX:
+        symbol += _SUFFIX[exchange]
+
+    if record.get("trade_id") not in (None, ""):
+        ref = f"trade:{exchange}:{record['trade_id']}"
+    elif record.get("folio") not in (None, ""):
+        ref = f"cas:{record['folio']}:{symbol}:{date}:{units}:{price}"
+    else:
+        ref = None  # Nothing stable to deduplicate on
+    return side, (investment_type, symbol, date, price, units, lot_currency(investment_type, symbol), ref)
+
+
+def _enrich(symbols, max_workers, rate):
+    """Fetches metadata for unknown symbols concurrently (rate-limited); yields (symbol, type, metadata or error)."""
+    limiter = TokenBucket(rate) if rate else None
+
+    def fetch(symbol, investment_type):
+        if limiter:
+            limiter.acquire()
+        return fetch_metadata(symbol, investment_type)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch, symbol, kind): (symbol, kind) for symbol, kind in symbols.items()}
+        for future in as_completed(futures):
+            symbol, kind = futures[future]
+            try:
+                yield symbol, kind, future.result()
+            except Exception as e:
+                yield symbol, kind, e
+
+
+def import_file(path, default_type=None, max_workers=8, rate=5.0):
+    """Streams a tradebook or CAS file into the portfolio in one transaction and returns import statistics.
+
+    Symbols are checked against the securities cache as rows arrive; only the
+    unknown ones are looked up afterwards, in one concurrent batch. Lots whose
+    symbol the provider doesn't recognise are dropped again. Rows with a trade
+    id (or CAS folio) are skipped when already imported, so rerunning is safe.
+    Every trade also goes into the transactions ledger. Sells are recorded
+    there and then close portfolio lots oldest first (after the snapshots are
+    rebuilt, so history keeps the units until their sale date). Within a
+    chunk, same-day buys are recorded ahead of sells.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    stats = {"rows": 0, "imported": 0, "duplicates": 0, "sells": 0, "not_trades": 0,
+             "invalid": 0, "rejected": 0, "looked_up": 0}
+    known = {}          # symbol -> cached security, or None when not cached
+    unknown = {}        # symbol -> investment type, for the lookup batch
+    names = {}          # symbol -> scheme name carried by CAS rows
+    first_date = None
+    started = time.perf_counter()
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM portfolio")
+    last_id = top_id = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM transactions")
+    last_txn_id = cursor.fetchone()[0]
+
+    def flush(buys, sells):
+        nonlocal top_id
+        # The ledger also knows trades whose lot a later sale has closed
+        cursor.executemany("""
+            INSERT OR IGNORE INTO portfolio
+            (investment_type, symbol, name, sector, industry, purchase_date, purchase_price, units, currency, trade_ref)
+            SELECT ?1, ?2, 'Unknown', 'N/A', 'N/A', ?3, ?4, ?5, ?6, ?7
+            WHERE ?7 IS NULL OR NOT EXISTS (SELECT 1 FROM transactions WHERE trade_ref = ?7)
+        """, buys)
+        stats["imported"] += cursor.rowcount
+        stats["duplicates"] += len(buys) - cursor.rowcount
+
+        cursor.execute("""
+            SELECT purchase_date, symbol, investment_type, 'BUY', units, purchase_price, 0, currency, id, trade_ref
+            FROM portfolio WHERE id > ? ORDER BY id
+        """, (top_id,))
+        ledger_rows = cursor.fetchall()
+        if ledger_rows:
+            top_id = ledger_rows[-1][8]
+        ledger_rows += [(date, symbol, kind, "SELL", units, price, 0, currency, None, ref)
+                        for kind, symbol, date, price, units, currency, ref in sells]
+        recorded_sells = record_transactions(conn, ledger_rows) - (len(ledger_rows) - len(sells))
+        stats["sells"] += recorded_sells
+        stats["duplicates"] += len(sells) - recorded_sells
+
+        trades = buys + sells
+        new = {lot[1] for lot in trades if lot[1] not in known}
+        known.update(get_cached_securities(new))
+        for symbol in new:
+            known.setdefault(symbol, None)
+        for lot in trades:
+            if known[lot[1]] is None:
+                unknown.setdefault(lot[1], lot[0])
+
+    with conn:
+        buys, sells = [], []
+        for number, record in enumerate(read_records(path), 1):
+            stats["rows"] += 1
+            if number % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - started
+                print(f"📥 {number:,} rows read, {stats['imported']:,} lots written ({number / elapsed:,.0f} rows/s)")
+            try:
+                side, lot = to_lot(record, default_type)
+            except RowError as e:
+                stats["invalid"] += 1
+                if stats["invalid"] <= 10:
+                    print(f"⚠️ Record {number} skipped: {e}")
+                continue
+            if side is None:
+                stats["not_trades"] += 1
+                continue
+            if record.get("name") and lot[0] == "Mutual Fund":
+                names.setdefault(lot[1], str(record["name"]).strip())
+            if side == "sell":
+                sells.append(lot)
+            else:
+                first_date = min(first_date or lot[2], lot[2])
+                buys.append(lot)
+            if len(buys) + len(sells) >= CHUNK_ROWS:
+                flush(buys, sells)
+                buys, sells = [], []
+        if buys or sells:
+            flush(buys, sells)
+
+        # Fund names carried by the statement itself need no lookup
+        for symbol in [symbol for symbol in unknown if symbol in names]:
+            store_security(symbol, unknown.pop(symbol), {"name": names[symbol], "currency": "INR"}, commit=False)
+
+        rejected = []
+        if unknown:
+            print(f"🔎 Looking up {len(unknown)} symbols not in the local cache...")
+        for symbol, investment_type, metadata in _enrich(unknown, max_workers, rate):
+            stats["looked_up"] += 1
+            if isinstance(metadata, Exception):
+                print(f"⚠️ Could not verify {symbol} ({metadata}); keeping its lots as Unknown")
+            elif metadata:
+                store_security(symbol, investment_type, metadata, commit=False)
+            else:
+                rejected.append(symbol)
+                print(f"❌ {symbol} is not a known {investment_type.lower()}; its lots were not imported")
+
+        for start in range(0, len(rejected), 500):
+            batch = rejected[start:start + 500]
+            cursor.execute(f"DELETE FROM portfolio WHERE id > ? AND symbol IN ({', '.join('?' * len(batch))})",
+                           (last_id, *batch))
+            stats["rejected"] += cursor.rowcount
+            cursor.execute(f"""
+                DELETE FROM transactions WHERE id > ? AND kind = 'SELL' AND symbol IN ({', '.join('?' * len(batch))})
+            """, (last_txn_id, *batch))
+            stats["sells"] -= cursor.rowcount
+            cursor.execute(f"DELETE FROM transactions WHERE id > ? AND symbol IN ({', '.join('?' * len(batch))})",
+                           (last_txn_id, *batch))
+        stats["imported"] -= stats["rejected"]
+
+        # Names, sectors and industries for every new lot in one statement
+        cursor.execute("""
+            UPDATE portfolio SET
+                name = COALESCE(s.name, 'Unknown'),
+                sector = CASE WHEN portfolio.investment_type = 'Stock' THEN COALESCE(s.sector, 'N/A') ELSE 'N/A' END,
+                industry = CASE WHEN portfolio.investment_type = 'Stock' THEN COALESCE(s.industry, 'N/A') ELSE 'N/A' END
+            FROM securities s
+            WHERE s.symbol = portfolio.symbol AND portfolio.id > ?
+        """, (last_id,))
+
+        if stats["imported"] and first_date:
+            cursor.execute("SELECT DISTINCT date FROM price_history WHERE date >= ?", (first_date,))
+            rebuild_dates(conn, [row[0] for row in cursor.fetchall()])
+
+        cursor.execute("""
+            SELECT symbol, date, units FROM transactions
+            WHERE id > ? AND kind = 'SELL' ORDER BY date, id
+        """, (last_txn_id,))
+        for symbol, date, units in cursor.fetchall():
+            close_lots(conn, symbol, date, units)
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    print(
+        f"✅ Imported {stats['imported']:,} lots from {stats['rows']:,} rows in {stats['seconds']:.1f}s "
+        f"({stats['rows'] / stats['seconds'] if stats['seconds'] else 0:,.0f} rows/s): "
+        f"{stats['duplicates']} already imported, {stats['sells']} sells recorded in the ledger, "
+        f"{stats['invalid']} invalid, {stats['rejected']} with unknown symbols"
+    )
+    return stats
+
+
+def add_arguments(parser):
+    """Registers the import's options on an argparse (sub)parser."""
+    parser.add_argument("path", help="tradebook or CAS file (.csv, .xlsx, .json, .jsonl)")
+    parser.add_argument("--type", dest="default_type", choices=["Stock", "Mutual Fund"],
+                        help="investment type for rows that don't say (default: guess from the symbol)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent lookups of unknown symbols (default: 8)")
+    parser.add_argument("--rate", type=float, default=5.0, help="max provider requests per second (default: 5)")
+
+
+def run(args):
+    return import_file(args.path, args.default_type, max_workers=args.workers, rate=args.rate)
@@ -0,0 +1,162 @@
+import cProfile
+import functools
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Off unless $PORTFOLIO_PROFILE is set (or enable() is called, e.g. by `main.py --profile`)
+ENABLED = os.getenv("PORTFOLIO_PROFILE", "") not in ("", "0")
+PROFILE_OUT = os.getenv("PORTFOLIO_PROFILE_OUT")  # Optional cProfile output path
+
+_totals = {}               # stage -> [calls, seconds] for the current action
+_lock = threading.Lock()
+_NULL = nullcontext()
+
+
+def enable(profile_out=None):
+    """Turns instrumentation on for the rest of the process, optionally writing a cProfile per action."""
+    global ENABLED, PROFILE_OUT
+    ENABLED = True
+    PROFILE_OUT = profile_out or PROFILE_OUT
+
+
+def record(stage, seconds):
+    with _lock:
+        totals = _totals.setdefault(stage, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start)
+
+
+def span(stage):
+    """Context manager timing a block under `stage`; a shared no-op when instrumentation is off."""
+    return _Span(stage) if ENABLED else _NULL
+
+
+def timed(stage):
+    """Decorator timing every call under `stage`. Costs one flag check per call when disabled."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class TimedProvider:
+    """Proxy timing every provider method under "network.<method>" (lazy iterators time their creation only)."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        return timed(f"network.{name}")(attr) if callable(attr) else attr
+
+
+class _TimedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        with _Span("sqlite"):
+            return super().execute(*args)
+
+    def executemany(self, *args):
+        with _Span("sqlite"):
+            return super().executemany(*args)
+
+    def fetchone(self):
+        with _Span("sqlite"):
+            return super().fetchone()
+
+    def fetchmany(self, *args):
+        with _Span("sqlite"):
+            return super().fetchmany(*args)
+
+    def fetchall(self):
+        with _Span("sqlite"):
+            return super().fetchall()
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection factory timing statements, fetches and commits under "sqlite"."""
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        with _Span("sqlite"):
+            super().commit()
+
+
+def report(name, elapsed, totals):
+    """Prints the per-stage breakdown of one action to stderr (stdout may be a command's JSON/CSV output).
+
+    Stages can nest (sqlite inside valuation, say), so the rows need not add up to the total.
+    """
+    print(f"\n⏱  {name}: {elapsed * 1000:.1f} ms", file=sys.stderr)
+    accounted = 0.0
+    for stage, (calls, seconds) in sorted(totals.items(), key=lambda item: item[1][1], reverse=True):
+        if not stage.startswith("network."):  # Provider calls run on worker threads and overlap
+            accounted += seconds
+        print(f"   {stage:<28} {calls:>6} calls {seconds * 1000:10.1f} ms {seconds / elapsed * 100 if elapsed else 0:6.1f}%", file=sys.stderr)
+    network = sum(seconds for stage, (_, seconds) in totals.items() if stage.startswith("network."))
+    other = max(elapsed - accounted - network, 0.0)
+    print(f"   {'other':<28} {'':>12} {other * 1000:10.1f} ms {other / elapsed * 100 if elapsed else 0:6.1f}%", file=sys.stderr)
+    if network > elapsed:
+        print("   (network time is summed over concurrent requests)", file=sys.stderr)
+
+
+@contextmanager
+def action(name):
+    """Times one CLI action and prints its per-stage breakdown; writes a cProfile file if configured."""
+    if not ENABLED:
+        yield
+        return
+
+    with _lock:
+        _totals.clear()
+    profiler = cProfile.Profile() if PROFILE_OUT else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        with _lock:
+            totals = {stage: list(values) for stage, values in _totals.items()}
+        report(name, elapsed, totals)
+        if profiler:
+            root, ext = os.path.splitext(PROFILE_OUT)
+            path = f"{root}-{re.sub(r'[^A-Za-z0-9]+', '-', name).strip('-').lower()}{ext or '.prof'}"
+            profiler.dump_stats(path)
+            print(f"   cProfile written to {path} (main thread only)", file=sys.stderr)
@@ -0,0 +1,330 @@
+import datetime
+import json
+from collections import deque
+
+from db import get_connection
+from fx import load_rate_table, lookup_rate
+from securities import lot_currency
+from snapshots import apply_lot_change
+
+METHODS = ("fifo", "average")
+CHECKPOINT_EVERY = 250      # Transactions per symbol replayed before the matching state is stored
+EPSILON = 1e-9
+
+_INSERT = """
+    INSERT OR IGNORE INTO transactions
+    (date, symbol, investment_type, kind, units, price, amount, currency, lot_id, trade_ref)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+class LotBook:
+    """Open lots and running realized P&L of one symbol under FIFO or average-cost matching."""
+
+    def __init__(self, method="fifo", lots=(), realized=0.0, dividends=0.0):
+        if method not in METHODS:
+            raise ValueError(f"Unknown matching method {method!r} (expected one of {', '.join(METHODS)})")
+        self.method = method
+        self.lots = deque(list(lot) for lot in lots)  # [units, unit cost, acquired on], oldest first
+        self.realized = realized
+        self.dividends = dividends
+
+    @property
+    def units(self):
+        return sum(lot[0] for lot in self.lots)
+
+    @property
+    def cost(self):
+        return sum(lot[0] * lot[1] for lot in self.lots)
+
+    def apply(self, kind, date, units, price, amount):
+        """Applies one transaction and returns the P&L it realized.
+
+        SPLIT takes the ratio (new units per old) in `units`; DIVIDEND the cash in
+        `amount`. A sell beyond the open units only matches what is held (e.g. a
+        tradebook that starts after the original purchase).
+        """
+        if kind == "BUY":
+            if self.method == "average" and self.lots:
+                held, cost = self.units, self.cost
+                self.lots = deque([[held + units, (cost + units * price) / (held + units), self.lots[0][2]]])
+            else:
+                self.lots.append([units, price, date])
+        elif kind == "SELL":
+            realized, remaining = 0.0, units
+            while remaining > EPSILON and self.lots:
+                lot = self.lots[0]
+                matched = min(lot[0], remaining)
+                realized += matched * (price - lot[1])
+                lot[0] -= matched
+                remaining -= matched
+                if lot[0] <= EPSILON:
+                    self.lots.popleft()
+            self.realized += realized
+            return realized
+        elif kind == "SPLIT":
+            for lot in self.lots:
+                lot[0] *= units
+                lot[1] /= units
+        elif kind == "DIVIDEND":
+            self.dividends += amount
+        return 0.0
+
+
+def record_transactions(conn, rows):
+    """Appends ledger rows (date, symbol, investment_type, kind, units, price, amount, currency, lot_id, trade_ref).
+
+    Rows whose trade_ref is already recorded are skipped. Stored checkpoints
+    after a back-dated row are dropped so they get rebuilt on the next query.
+    The caller owns the transaction. Returns the number of rows inserted.
+    """
+    rows = list(rows)
+    cursor = conn.cursor()
+    cursor.executemany(_INSERT, rows)
+    earliest = {}
+    for row in rows:
+        earliest[row[1]] = min(earliest.get(row[1], row[0]), row[0])
+    # Same-day rows sort after the checkpoint (higher id), so only later checkpoints are stale
+    conn.executemany("DELETE FROM ledger_checkpoints WHERE symbol = ? AND date > ?", earliest.items())
+    return cursor.rowcount
+
+
+def remove_lot(conn, lot_id):
+    """Deletes a portfolio lot, the BUY recorded for it and the checkpoints it affected, undoing its snapshots.
+
+    Raises ValueError, before anything is written for good, when the ledger
+    no longer moves in step with the portfolio: a sale matched against the lot
+    (so the ledger would lose more or fewer units than the portfolio) or a
+    later sale left uncovered. Record a correcting transaction instead. The
+    caller owns the transaction. Returns False when there is no such lot.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT symbol, purchase_date, purchase_price, units, currency FROM portfolio WHERE id = ?", (lot_id,))
+    lot = cursor.fetchone()
+    if lot is None:
+        return False
+    symbol, purchase_date = lot[0], lot[1]
+    held_before, uncovered_before = _replay(conn, symbol, purchase_date)
+
+    conn.execute("DELETE FROM portfolio WHERE id = ?", (lot_id,))
+    conn.execute("DELETE FROM ledger_checkpoints WHERE symbol = ? AND date >= ?", (symbol, purchase_date))
+    conn.execute("DELETE FROM transactions WHERE lot_id = ?", (lot_id,))
+    if lot[2] is not None:  # Unpriced lots never entered the ledger or the snapshot costs
+        held_after, uncovered_after = _replay(conn, symbol, purchase_date)
+        if uncovered_after and not uncovered_before:
+            raise ValueError(f"Cannot delete lot {lot_id} of {symbol}: the sale of {uncovered_after[1]:g} units "
+                             f"on {uncovered_after[0]} would exceed the {uncovered_after[2]:g} units then held")
+        if not uncovered_after and abs((held_before.units - held_after.units) - lot[3]) > EPSILON:
+            raise ValueError(f"Cannot delete lot {lot_id} of {symbol}: sales or splits in the ledger were matched "
+                             f"against it; record a correcting transaction instead")
+        apply_lot_change(conn, *lot, sign=-1)
+    return True
+
+
+def close_lots(conn, symbol, date, units):
+    """Takes `units` sold on `date` out of the symbol's portfolio lots, oldest first, and out of every snapshot
+    from that day on.
+
+    Fully sold lots are deleted from portfolio; their BUY stays in the ledger
+    (unlinked). Returns the units no lot covered. The caller owns the transaction.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, purchase_date, purchase_price, units, currency FROM portfolio
+        WHERE symbol = ? AND purchase_date <= ?
+        ORDER BY purchase_date, id
+    """, (symbol, date))
+    remaining = units
+    for lot_id, purchase_date, purchase_price, held, currency in cursor.fetchall():
+        if remaining <= EPSILON:
+            break
+        sold = min(held, remaining)
+        if held - sold <= EPSILON:
+            conn.execute("DELETE FROM portfolio WHERE id = ?", (lot_id,))
+            conn.execute("UPDATE transactions SET lot_id = NULL WHERE lot_id = ?", (lot_id,))
+        else:
+            conn.execute("UPDATE portfolio SET units = units - ? WHERE id = ?", (sold, lot_id))
+        if purchase_price is not None:
+            # The lot stays in the snapshots before the sale date
+            apply_lot_change(conn, symbol, date, purchase_price, sold, currency, sign=-1)
+        remaining -= sold
+    return max(remaining, 0.0)
+
+
+def split_lots(conn, symbol, date, ratio):
+    """Scales the symbol's portfolio lots bought on or before a split `date` by `ratio` (new units per old),
+    keeping their cost, and re-values every snapshot from that day on with the new units.
+
+    The caller owns the transaction.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT purchase_price, units, currency FROM portfolio
+        WHERE symbol = ? AND purchase_date <= ? AND purchase_price IS NOT NULL
+    """, (symbol, date))
+    for purchase_price, units, currency in cursor.fetchall():
+        # Cost nets out; only the exposure from the split day on changes
+        apply_lot_change(conn, symbol, date, purchase_price, units, currency, sign=-1)
+        apply_lot_change(conn, symbol, date, purchase_price / ratio, units * ratio, currency)
+    conn.execute("""
+        UPDATE portfolio SET units = units * ?1, purchase_price = purchase_price / ?1
+        WHERE symbol = ?2 AND purchase_date <= ?3
+    """, (ratio, symbol, date))
+
+
+def load_books(conn, as_of, method="fifo", symbols=None):
+    """Returns symbol -> LotBook as of the end of `as_of` (YYYY-MM-DD), for every symbol or the given ones.
+
+    Each symbol starts from its latest checkpoint on or before that day and
+    replays only the transactions after it (an index range seek); a new
+    checkpoint is stored every CHECKPOINT_EVERY replayed transactions, so
+    later queries start further on.
+    """
+    cursor = conn.cursor()
+    if symbols is None:
+        cursor.execute("SELECT DISTINCT symbol FROM transactions")
+        symbols = [row[0] for row in cursor.fetchall()]
+
+    books, checkpoints = {}, []
+    for symbol in symbols:
+        cursor.execute("""
+            SELECT date, txn_id, lots, realized, dividends FROM ledger_checkpoints
+            WHERE symbol = ? AND method = ? AND date <= ?
+            ORDER BY date DESC, txn_id DESC LIMIT 1
+        """, (symbol, method, as_of))
+        checkpoint = cursor.fetchone()
+        if checkpoint:
+            after = checkpoint[:2]
+            book = LotBook(method, json.loads(checkpoint[2]), checkpoint[3], checkpoint[4])
+        else:
+            after, book = ("", 0), LotBook(method)
+
+        cursor.execute("""
+            SELECT id, date, kind, units, price, amount FROM transactions
+            WHERE symbol = ? AND (date, id) > (?, ?) AND date <= ?
+            ORDER BY date, id
+        """, (symbol, *after, as_of))
+        for replayed, (txn_id, date, kind, units, price, amount) in enumerate(cursor.fetchall(), 1):
+            book.apply(kind, date, units, price, amount)
+            if replayed % CHECKPOINT_EVERY == 0:
+                checkpoints.append((symbol, method, date, txn_id, json.dumps(list(book.lots)), book.realized, book.dividends))
+        books[symbol] = book
+
+    if checkpoints:
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO ledger_checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)", checkpoints)
+    return books
+
+
+def _replay(conn, symbol, since):
+    """(book, uncovered) for a symbol: its FIFO position after every transaction, and (date, units, held) of the
+    first SELL on or after `since` selling more than was held then (the book stops there), or None.
+
+    Reads inside the caller's transaction, so it sees rows not yet committed.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT date, txn_id, lots FROM ledger_checkpoints
+        WHERE symbol = ? AND method = 'fifo' AND date <= ?
+        ORDER BY date DESC, txn_id DESC LIMIT 1
+    """, (symbol, since))
+    checkpoint = cursor.fetchone()
+    after, book = (checkpoint[:2], LotBook(lots=json.loads(checkpoint[2]))) if checkpoint else (("", 0), LotBook())
+    cursor.execute("""
+        SELECT date, kind, units, price, amount FROM transactions
+        WHERE symbol = ? AND (date, id) > (?, ?)
+        ORDER BY date, id
+    """, (symbol, *after))
+    for date, kind, units, price, amount in cursor.fetchall():
+        if kind == "SELL" and date >= since and units > book.units + EPSILON:
+            return book, (date, units, book.units)
+        book.apply(kind, date, units, price, amount)
+    return book, None
+
+
+def _price_on(cursor, symbol, date):
+    cursor.execute(
+        "SELECT price FROM price_history WHERE symbol = ? AND date <= ? ORDER BY date DESC LIMIT 1", (symbol, date)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def profit_and_loss(as_of=None, method="fifo", since=None, conn=None):
+    """Realized and unrealized P&L per symbol at the end of `as_of` (default: today), plus INR totals.
+
+    Unrealized P&L values the open lots at the last stored price on or before
+    `as_of`. With `since`, realized P&L and dividends cover [since, as_of] only.
+    Returns (rows, totals).
+    """
+    conn = conn or get_connection()
+    as_of = as_of or datetime.date.today().isoformat()
+    books = load_books(conn, as_of, method)
+    before = {}
+    if since:
+        day_before = (datetime.date.fromisoformat(since) - datetime.timedelta(days=1)).isoformat()
+        before = load_books(conn, day_before, method)
+
+    cursor = conn.cursor()
+    usd_rate = lookup_rate(load_rate_table(conn=conn), as_of)
+
+    rows = []
+    totals = {"cost": 0.0, "value": 0.0, "unrealized": 0.0, "realized": 0.0, "dividends": 0.0}
+    for symbol, book in sorted(books.items()):
+        cursor.execute("SELECT investment_type, currency FROM transactions WHERE symbol = ? LIMIT 1", (symbol,))
+        investment_type, currency = cursor.fetchone()
+        earlier = before.get(symbol)
+        units, cost = book.units, book.cost
+        price = _price_on(cursor, symbol, as_of) if units > EPSILON else None
+        value = units * price if price is not None else None
+        row = {
+            "symbol": symbol, "investment_type": investment_type, "currency": currency,
+            "units": round(units, 6), "cost": cost, "price": price, "value": value,
+            "unrealized": value - cost if value is not None else None,
+            "realized": book.realized - (earlier.realized if earlier else 0.0),
+            "dividends": book.dividends - (earlier.dividends if earlier else 0.0),
+        }
+        rows.append(row)
+        rate = usd_rate if currency == "USD" else 1
+        for key in totals:
+            if row[key] is not None:
+                totals[key] += row[key] * rate
+    totals.update({"as_of": as_of, "since": since, "method": method, "usd_rate": usd_rate})
+    return rows, totals
+
+
+def record(kind, symbol, date, units=0.0, price=0.0, amount=0.0, investment_type=None, conn=None):
+    """Records one SELL, DIVIDEND or SPLIT (or BUY without a portfolio lot) for a symbol already in the ledger.
+
+    A sell must not exceed the units held on its date, and no transaction may
+    leave a later sell uncovered (e.g. a back-dated sell). A sell also closes
+    portfolio lots (close_lots), so valuation, snapshots and risk stop counting
+    the sold units, and a split scales the lots held on its date (split_lots),
+    so the portfolio keeps matching the ledger. Returns the symbol's position
+    (LotBook) after the transaction.
+    """
+    conn = conn or get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT investment_type, currency FROM transactions WHERE symbol = ? LIMIT 1", (symbol,))
+    known = cursor.fetchone()
+    if known is None and kind != "BUY":
+        raise ValueError(f"{symbol} has no transactions in the ledger")
+    investment_type, currency = known or (investment_type or "Stock", lot_currency(investment_type or "Stock", symbol))
+
+    if kind == "SELL":
+        held = load_books(conn, date, symbols=[symbol]).get(symbol, LotBook()).units
+        if units > held + EPSILON:
+            raise ValueError(f"Cannot sell {units:g} units of {symbol} on {date}: only {held:g} held")
+    if kind == "SPLIT" and units <= 0:
+        raise ValueError("Split ratio must be positive")
+
+    with conn:
+        record_transactions(conn, [(date, symbol, investment_type, kind, units, price, amount, currency, None, None)])
+        _, uncovered = _replay(conn, symbol, date)
+        if uncovered:  # Raising rolls the insert back
+            raise ValueError(f"Cannot record this {kind.lower()} of {symbol} on {date}: the sale of "
+                             f"{uncovered[1]:g} units on {uncovered[0]} would exceed the {uncovered[2]:g} units then held")
+        if kind == "SELL":
+            close_lots(conn, symbol, date, units)
+        elif kind == "SPLIT":
+            split_lots(conn, symbol, date, units)
+    return load_books(conn, max(date, datetime.date.today().isoformat()), symbols=[symbol])[symbol]
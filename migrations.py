@@ -0,0 +1,408 @@
+import datetime
+
+from schema import (
+    PRICE_HISTORY_DDL, PRICE_HISTORY_INDEX_DDL, LATEST_PRICE_DDL, LATEST_PRICE_TRIGGERS,
+    rebuild_latest_price,
+)
+
+
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def _add_missing_columns(cursor, table, columns):
+    existing = _columns(cursor, table)
+    for name, definition in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def _001_core_tables(cursor):
+    """portfolio (with name/sector/industry) and portfolio_history."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            investment_type TEXT NOT NULL CHECK(investment_type IN ('Stock', 'Mutual Fund')),
+            symbol TEXT NOT NULL,
+            name TEXT,
+            sector TEXT,
+            industry TEXT,
+            purchase_date TEXT NOT NULL,
+            purchase_price REAL NOT NULL,
+            units REAL NOT NULL,
+            currency TEXT NOT NULL
+        )
+    """)
+    # Databases created by older initialize_db() versions lack these
+    _add_missing_columns(cursor, "portfolio", [
+        ("name", "TEXT DEFAULT NULL"),
+        ("sector", "TEXT"),
+        ("industry", "TEXT"),
+    ])
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            total_value REAL NOT NULL,
+            total_cost REAL NOT NULL,
+            profit_loss REAL NOT NULL,
+            inr_exposure REAL NOT NULL,
+            usd_exposure REAL NOT NULL,
+            UNIQUE(date) ON CONFLICT REPLACE
+        )
+    """)
+
+
+def _002_price_history(cursor):
+    """Single price_history definition with UNIQUE(symbol, date), covering index and latest_price."""
+    if _table_exists(cursor, "price_history"):
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'price_history'")
+        if "UNIQUE" not in cursor.fetchone()[0].upper():
+            # Created by the old create_price_history_table(): rebuild, keeping the newest row per day
+            cursor.execute("ALTER TABLE price_history RENAME TO price_history_old")
+            cursor.execute(PRICE_HISTORY_DDL)
+            cursor.execute("""
+                INSERT INTO price_history (symbol, date, price)
+                SELECT symbol, date, price FROM price_history_old
+                WHERE id IN (SELECT MAX(id) FROM price_history_old GROUP BY symbol, date)
+            """)
+            cursor.execute("DROP TABLE price_history_old")
+    cursor.execute(PRICE_HISTORY_DDL)
+    cursor.execute(PRICE_HISTORY_INDEX_DDL)
+    cursor.execute(LATEST_PRICE_DDL)
+    for trigger in LATEST_PRICE_TRIGGERS:
+        cursor.execute(trigger)
+    rebuild_latest_price(cursor)
+
+
+def _003_fx_rates(cursor):
+    """Persisted FX rates, one row per currency pair per day."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fx_rates (
+            base TEXT NOT NULL,
+            quote TEXT NOT NULL,
+            date TEXT NOT NULL,
+            rate REAL NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (base, quote, date)
+        )
+    """)
+
+
+def _004_goals(cursor):
+    """goals and goal_investments, used by insert_sample_goals()."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS goals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            target_amount REAL NOT NULL,
+            time_horizon INTEGER NOT NULL,
+            priority_level TEXT NOT NULL DEFAULT 'Standard',
+            expected_cagr REAL,
+            goal_creation_date TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS goal_investments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            goal_id INTEGER NOT NULL REFERENCES goals(id) ON DELETE CASCADE,
+            investment_type TEXT NOT NULL,
+            investment_date TEXT NOT NULL,
+            amount REAL NOT NULL
+        )
+    """)
+
+
+def _005_hot_query_indexes(cursor):
+    """Indexes behind the portfolio lookups by symbol/type and per-goal cash flows."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_portfolio_symbol ON portfolio (symbol)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_portfolio_type ON portfolio (investment_type, symbol)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_goal_investments_goal ON goal_investments (goal_id, investment_date)")
+
+
+def _006_incremental_snapshots(cursor):
+    """Native-currency components on portfolio_history for incremental updates, and a by-date price index."""
+    # Rows written before this migration keep usd_rate NULL; _014 fills it in from their recorded totals
+    _add_missing_columns(cursor, "portfolio_history", [
+        ("usd_rate", "REAL"),
+        ("inr_cost", "REAL NOT NULL DEFAULT 0"),
+        ("usd_cost_native", "REAL NOT NULL DEFAULT 0"),
+        ("usd_value_native", "REAL NOT NULL DEFAULT 0"),
+    ])
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_history_date ON price_history (date, symbol, price)")
+
+
+def _007_ohlc_cache(cursor):
+    """Local daily OHLC bar store with per-symbol coverage for get_historical_price()."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ohlc_bars (
+            symbol TEXT NOT NULL,
+            date TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL NOT NULL,
+            volume REAL,
+            PRIMARY KEY (symbol, date)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ohlc_coverage (
+            symbol TEXT PRIMARY KEY,
+            first_date TEXT NOT NULL,
+            last_date TEXT NOT NULL,
+            checked_on TEXT NOT NULL
+        )
+    """)
+
+
+def _008_securities(cursor):
+    """Security metadata cache keyed by symbol, seeded from existing portfolio rows."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS securities (
+            symbol TEXT PRIMARY KEY,
+            investment_type TEXT NOT NULL,
+            name TEXT,
+            sector TEXT,
+            industry TEXT,
+            currency TEXT,
+            fetched_at REAL NOT NULL
+        )
+    """)
+    # Names already stored on lots count as fetched; sector/industry only where known
+    cursor.execute("""
+        INSERT OR IGNORE INTO securities (symbol, investment_type, name, sector, industry, currency, fetched_at)
+        SELECT symbol, investment_type, name, sector, industry, currency, 0
+        FROM portfolio
+        WHERE name IS NOT NULL AND name != 'Unknown'
+          AND (investment_type = 'Mutual Fund' OR (sector IS NOT NULL AND sector != 'N/A'))
+        GROUP BY symbol
+    """)
+
+
+def _009_backfill_progress(cursor):
+    """Per-job progress rows so interrupted backfills can resume where they stopped."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            job TEXT NOT NULL,
+            item TEXT NOT NULL,
+            status TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (job, item)
+        ) WITHOUT ROWID
+    """)
+
+
+def _010_lot_trade_ref(cursor):
+    """Optional source reference on portfolio lots so re-importing a tradebook skips trades already loaded."""
+    _add_missing_columns(cursor, "portfolio", [("trade_ref", "TEXT")])
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_portfolio_trade_ref ON portfolio (trade_ref)
+        WHERE trade_ref IS NOT NULL
+    """)
+
+
+def _011_transactions_ledger(cursor):
+    """Transactions ledger (buys, sells, dividends, splits) with lot-matching checkpoints, seeded from portfolio lots."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            investment_type TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK(kind IN ('BUY', 'SELL', 'DIVIDEND', 'SPLIT')),
+            units REAL NOT NULL DEFAULT 0,
+            price REAL NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0,
+            currency TEXT NOT NULL,
+            lot_id INTEGER,
+            trade_ref TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_symbol_date ON transactions (symbol, date, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_lot ON transactions (lot_id) WHERE lot_id IS NOT NULL")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_trade_ref ON transactions (trade_ref)
+        WHERE trade_ref IS NOT NULL
+    """)
+    # Matching state after the transaction (date, txn_id) for each method; open lots as JSON
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+            symbol TEXT NOT NULL,
+            method TEXT NOT NULL,
+            date TEXT NOT NULL,
+            txn_id INTEGER NOT NULL,
+            lots TEXT NOT NULL,
+            realized REAL NOT NULL,
+            dividends REAL NOT NULL,
+            PRIMARY KEY (symbol, method, date, txn_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        INSERT INTO transactions (date, symbol, investment_type, kind, units, price, currency, lot_id, trade_ref)
+        SELECT purchase_date, symbol, investment_type, 'BUY', units, purchase_price, currency, id, trade_ref
+        FROM portfolio WHERE purchase_price IS NOT NULL
+        ORDER BY purchase_date, id
+    """)
+
+
+def _012_goal_values(cursor):
+    """Latest known value of each goal (and when it was valued) for actual-return calculations."""
+    _add_missing_columns(cursor, "goals", [
+        ("current_value", "REAL"),
+        ("valued_on", "TEXT"),
+    ])
+
+
+def _013_risk_state(cursor):
+    """Rolling-window return moments per risk window, updated one day at a time by risk.py."""
+    # Raw array bytes: the window's forward-filled prices and the pairwise count/sum/product matrices
+    # (counts and products are symmetric, so only their upper triangles are stored)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS risk_state (
+            window_days INTEGER PRIMARY KEY,
+            symbols TEXT NOT NULL,
+            dates TEXT NOT NULL,
+            source_mark TEXT NOT NULL,
+            prices BLOB NOT NULL,
+            counts BLOB NOT NULL,
+            sums BLOB NOT NULL,
+            products BLOB NOT NULL,
+            updates INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def _014_legacy_snapshot_rates(cursor):
+    """Native-currency components for pre-_006 snapshot rows, derived from their recorded totals.
+
+    The row's USD rate is its recorded usd_exposure over the native USD value of
+    the lots priced that day, and inr_cost takes what total_cost leaves, so the
+    derived totals reproduce the recorded ones exactly. Rows with USD exposure
+    but no priced USD lots (or no stored FX rate for an all-INR row) stay NULL
+    and are left as recorded.
+    """
+    cursor.execute("SELECT date, total_cost, usd_exposure FROM portfolio_history WHERE usd_rate IS NULL")
+    legacy = cursor.fetchall()
+    if not legacy:
+        return
+    cursor.execute("""
+        SELECT ph.date, SUM(p.purchase_price * p.units), SUM(ph.price * p.units)
+        FROM portfolio_history h
+        JOIN price_history ph ON ph.date = h.date
+        JOIN portfolio p ON p.symbol = ph.symbol AND p.purchase_date <= ph.date AND p.currency = 'USD'
+        WHERE h.usd_rate IS NULL
+        GROUP BY ph.date
+    """)
+    native = {date: (cost, value) for date, cost, value in cursor.fetchall()}
+
+    rows = []
+    for date, total_cost, usd_exposure in legacy:
+        usd_cost, usd_value = native.get(date, (0.0, 0.0))
+        if usd_exposure > 0 and usd_value > 0:
+            rate = usd_exposure / usd_value
+        elif not usd_exposure and not usd_value:
+            # No USD holdings: the rate only matters to later changes, so take the stored one
+            cursor.execute("""
+                SELECT rate FROM fx_rates WHERE base = 'USD' AND quote = 'INR' AND date <= ?
+                ORDER BY date DESC LIMIT 1
+            """, (date,))
+            stored = cursor.fetchone()
+            if stored is None:  # Before the first stored rate, use the earliest one
+                cursor.execute("SELECT rate FROM fx_rates WHERE base = 'USD' AND quote = 'INR' ORDER BY date LIMIT 1")
+                stored = cursor.fetchone()
+            if stored is None:
+                continue
+            rate, usd_cost = stored[0], 0.0
+        else:
+            continue
+        rows.append((rate, total_cost - usd_cost * rate, usd_cost, usd_value, date))
+    cursor.executemany("""
+        UPDATE portfolio_history SET usd_rate = ?, inr_cost = ?, usd_cost_native = ?, usd_value_native = ?
+        WHERE date = ?
+    """, rows)
+
+
+def _015_amfi_schemes(cursor):
+    """Name and latest NAV of every scheme in the last ingested AMFI NAV file, for offline scheme lookups."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS amfi_schemes (
+            scheme_code TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            nav REAL NOT NULL,
+            date TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+# Append only: never edit or reorder a migration that has shipped
+MIGRATIONS = [
+    (1, _001_core_tables),
+    (2, _002_price_history),
+    (3, _003_fx_rates),
+    (4, _004_goals),
+    (5, _005_hot_query_indexes),
+    (6, _006_incremental_snapshots),
+    (7, _007_ohlc_cache),
+    (8, _008_securities),
+    (9, _009_backfill_progress),
+    (10, _010_lot_trade_ref),
+    (11, _011_transactions_ledger),
+    (12, _012_goal_values),
+    (13, _013_risk_state),
+    (14, _014_legacy_snapshot_rates),
+    (15, _015_amfi_schemes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """Returns the highest applied migration version (0 for a fresh or pre-migration database)."""
+    cursor = conn.cursor()
+    if not _table_exists(cursor, "schema_version"):
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def migrate(conn):
+    """Applies every pending migration, each in its own transaction. Returns the versions applied."""
+    if current_version(conn) >= SCHEMA_VERSION:
+        return []
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+
+    applied = []
+    for version, step in MIGRATIONS:
+        cursor.execute("BEGIN IMMEDIATE")  # Take the write lock before re-checking the version
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            step(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, step.__doc__.strip(), datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
@@ -0,0 +1,66 @@
+from db import get_connection
+from providers import get_provider
+from snapshots import rebuild_dates
+
+BATCH_ROWS = 5000
+
+
+def _store_batch(conn, scheme_code, batch, first_held):
+    """Inserts one batch of NAVs in its own transaction and rebuilds the snapshots of the new held dates."""
+    with conn:
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM price_history").fetchone()[0]
+        cursor = conn.executemany("INSERT OR IGNORE INTO price_history (symbol, date, price) VALUES (?, ?, ?)", batch)
+        inserted = cursor.rowcount
+        if first_held and inserted:
+            cursor.execute("SELECT date FROM price_history WHERE id > ? AND symbol = ? AND date >= ?",
+                           (last_id, scheme_code, first_held))
+            rebuild_dates(conn, [row[0] for row in cursor.fetchall()])
+    return inserted
+
+
+def store_nav_history(conn, scheme_code, navs):
+    """Inserts every (date, nav) of one scheme not yet in price_history, committing every BATCH_ROWS rows.
+
+    Dates already stored are skipped by the UNIQUE(symbol, date) index, so
+    only the current batch is held in memory, and no write transaction stays
+    open while the stream is read. Snapshots are rebuilt for the new dates on
+    which the scheme was held. Returns the number of NAVs inserted.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(purchase_date) FROM portfolio WHERE symbol = ?", (scheme_code,))
+    first_held = cursor.fetchone()[0]
+
+    inserted, batch = 0, []
+    for date, nav in navs:
+        batch.append((scheme_code, date, nav))
+        if len(batch) >= BATCH_ROWS:
+            inserted += _store_batch(conn, scheme_code, batch, first_held)
+            batch = []
+    if batch:
+        inserted += _store_batch(conn, scheme_code, batch, first_held)
+    return inserted
+
+
+def backfill_nav_history(scheme_codes=None, conn=None, provider=None):
+    """Seeds price_history with the full NAV history of the given (default: all held) mutual funds.
+
+    The live provider streams mfapi responses (see providers.iter_nav_history),
+    so memory stays flat however long each history is.
+    """
+    conn = conn or get_connection()
+    provider = provider or get_provider()
+    if scheme_codes is None:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT symbol FROM portfolio WHERE investment_type = 'Mutual Fund'")
+        scheme_codes = [row[0] for row in cursor.fetchall()]
+
+    total = 0
+    for scheme_code in scheme_codes:
+        try:
+            added = store_nav_history(conn, scheme_code, provider.get_nav_history(scheme_code))
+        except Exception as e:
+            print(f"⚠️ Error fetching NAV history for {scheme_code}: {e}")
+            continue
+        total += added
+        print(f"✅ {scheme_code}: {added} new NAVs stored")
+    return total
@@ -0,0 +1,104 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from providers import get_provider
+from snapshots import apply_price_changes
+
+CHUNK_SIZE = 200  # Symbols per bulk yfinance download
+NAV_WORKERS = 8   # Concurrent mfapi requests
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def split_symbols(holdings):
+    """Splits (symbol, investment_type) pairs into distinct stock and mutual fund symbols.
+
+    Every mutual fund goes to the NAV path; one whose symbol is not a numeric
+    AMFI scheme code has no NAV source, so it is reported and left out.
+    """
+    stocks, funds = [], []
+    seen = set()
+    for symbol, investment_type in holdings:
+        if symbol in seen:
+            continue
+        seen.add(symbol)
+        if investment_type != "Mutual Fund":
+            stocks.append(symbol)
+        elif symbol.isdigit():
+            funds.append(symbol)
+        else:
+            print(f"⚠️ Skipping mutual fund {symbol}: not an AMFI scheme code")
+    return stocks, funds
+
+
+def _safe_nav(provider, scheme_code):
+    try:
+        return provider.get_nav(scheme_code)
+    except Exception as e:
+        print(f"⚠️ Error fetching NAV for {scheme_code}: {e}")
+        return None
+
+
+def fetch_latest_prices(holdings, provider=None, chunk_size=CHUNK_SIZE, max_workers=NAV_WORKERS):
+    """Fetches latest prices for (symbol, investment_type) pairs, deduplicated by symbol.
+
+    Stocks are fetched in bulk, one provider call per chunk; mutual fund NAVs are
+    fetched concurrently. Returns a dict of symbol -> price for every symbol that resolved.
+    """
+    provider = provider or get_provider()
+    stocks, funds = split_symbols(holdings)
+
+    prices = {}
+    for chunk in _chunks(stocks, chunk_size):
+        try:
+            prices.update(provider.get_quotes(chunk))
+        except Exception as e:
+            print(f"⚠️ Error fetching prices for {len(chunk)} stocks: {e}")
+
+    if funds:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(funds))) as pool:
+            for scheme_code, nav in zip(funds, pool.map(lambda code: _safe_nav(provider, code), funds)):
+                if nav is not None:
+                    prices[scheme_code] = nav
+
+    return prices
+
+
+def refresh_prices(conn, provider=None, today=None, chunk_size=CHUNK_SIZE, max_workers=NAV_WORKERS, usd_rate=None):
+    """Refreshes today's price for every held symbol and writes them in one transaction.
+
+    Today's portfolio_history snapshot is updated incrementally in the same transaction.
+
+    Returns a list of (symbol, price, previous_price) for the symbols that were recorded.
+    """
+    today = today or datetime.datetime.today().strftime("%Y-%m-%d")
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT DISTINCT symbol, investment_type FROM portfolio")
+    holdings = cursor.fetchall()
+    if not holdings:
+        return []
+
+    prices = fetch_latest_prices(holdings, provider, chunk_size, max_workers)
+    if not prices:
+        return []
+
+    # Last recorded price per symbol, in one query, for the change indicator
+    cursor.execute("SELECT symbol, price FROM latest_price")
+    previous = dict(cursor.fetchall())
+
+    # Prices already stored for today, so the snapshot only absorbs the difference
+    cursor.execute("SELECT symbol, price FROM price_history WHERE date = ?", (today,))
+    stored_today = dict(cursor.fetchall())
+
+    rows = [(symbol, today, price) for symbol, price in prices.items()]
+    with conn:
+        conn.executemany("REPLACE INTO price_history (symbol, date, price) VALUES (?, ?, ?)", rows)
+        apply_price_changes(
+            conn, today, [(symbol, price, stored_today.get(symbol)) for symbol, price in prices.items()], usd_rate
+        )
+
+    return [(symbol, price, previous.get(symbol)) for symbol, price in prices.items()]
@@ -0,0 +1,391 @@
+import abc
+import atexit
+import codecs
+import datetime
+import json
+import os
+import re
+import threading
+import time
+
+import instrumentation
+from http_client import get_client, get_json
+
+MFAPI_URL = "https://api.mfapi.in/mf/{}"
+FX_URL = "https://api.exchangerate-api.com/v4/latest/{}"
+CHUNK_BYTES = 64 * 1024
+
+_OBJECT = re.compile(r"\{[^{}]*\}")  # Innermost objects: the NAV entries (and `meta`, which has no date/nav)
+_FIELD = re.compile(r'"(date|nav)"\s*:\s*"([^"]*)"')
+
+
+def iter_nav_history(chunks):
+    """Yields (YYYY-MM-DD, nav) from an mfapi response body given as an iterable of byte chunks.
+
+    Only the unconsumed tail of the text is kept between chunks, so memory
+    stays flat however long the history is.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        end = 0
+        for match in _OBJECT.finditer(buffer):
+            end = match.end()
+            fields = dict(_FIELD.findall(match.group()))
+            date, nav = fields.get("date", ""), fields.get("nav")
+            if len(date) != 10 or nav is None:
+                continue
+            try:
+                yield f"{date[6:]}-{date[3:5]}-{date[:2]}", float(nav)  # dd-mm-yyyy -> yyyy-mm-dd
+            except ValueError:
+                continue
+        buffer = buffer[end:]
+        start = buffer.rfind("{")
+        buffer = buffer[start:] if start >= 0 else ""
+
+
+class MarketDataProvider(abc.ABC):
+    """Everything the app fetches from the outside world. Backends must implement every method.
+
+    Conventions: unknown symbols give None (metadata, NAV) or are left out
+    (quotes); transport failures raise.
+    """
+
+    @abc.abstractmethod
+    def get_quotes(self, symbols):
+        """Latest close for many stock symbols: dict of symbol -> price."""
+
+    @abc.abstractmethod
+    def get_history(self, symbol, start, end):
+        """Daily (date, open, high, low, close, volume) bars for [start, end] (YYYY-MM-DD)."""
+
+    @abc.abstractmethod
+    def get_metadata(self, symbol):
+        """Dict of name, sector, industry, currency for a stock, or None."""
+
+    @abc.abstractmethod
+    def get_fund_metadata(self, scheme_code):
+        """Same shape as get_metadata() for a mutual fund scheme code, or None."""
+
+    @abc.abstractmethod
+    def get_nav(self, scheme_code):
+        """Latest NAV for a mutual fund scheme code, or None."""
+
+    @abc.abstractmethod
+    def get_nav_history(self, scheme_code):
+        """Iterates (YYYY-MM-DD, nav) over a scheme's full NAV history."""
+
+    @abc.abstractmethod
+    def get_nav_file(self, url):
+        """Iterates the text lines of an AMFI NAVAll-style file."""
+
+    @abc.abstractmethod
+    def get_fx_rate(self, base, quote):
+        """Returns (rate, YYYY-MM-DD) for today's base->quote rate."""
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live market data: bulk yfinance downloads for stocks, mfapi/AMFI for mutual funds, exchangerate-api for FX.
+
+    yfinance (and pandas behind it) is imported on first use, so offline
+    backends and startup never pay for it.
+    """
+
+    def get_quotes(self, symbols):
+        """Fetches the latest close for many stock symbols in one bulk download."""
+        import yfinance as yf
+
+        if not symbols:
+            return {}
+
+        data = yf.download(list(symbols), period="5d", progress=False, threads=True, auto_adjust=False)
+        if data is None or data.empty:
+            return {}
+
+        closes = data["Close"]
+        if not hasattr(closes, "columns"):  # Single ticker comes back as a Series
+            closes = closes.to_frame(name=symbols[0])
+
+        quotes = {}
+        for symbol in symbols:
+            if symbol not in closes.columns:
+                continue
+            series = closes[symbol].dropna()
+            if not series.empty:
+                quotes[symbol] = float(series.iloc[-1])
+        return quotes
+
+    def get_history(self, symbol, start, end):
+        """Fetches daily (date, open, high, low, close, volume) bars for [start, end] (YYYY-MM-DD)."""
+        import yfinance as yf
+
+        end_exclusive = (datetime.date.fromisoformat(end) + datetime.timedelta(days=1)).isoformat()
+        history = yf.Ticker(symbol).history(start=start, end=end_exclusive, auto_adjust=False)
+        if history.empty:
+            return []
+        return [
+            (row.Index.strftime("%Y-%m-%d"), float(row.Open), float(row.High), float(row.Low), float(row.Close), float(row.Volume))
+            for row in history.itertuples()
+        ]
+
+    def get_metadata(self, symbol):
+        """Fetches name, sector, industry and currency for a stock in one `.info` call (None if unknown)."""
+        import yfinance as yf
+
+        info = yf.Ticker(symbol).info
+        name = info.get("longName") or info.get("shortName")
+        if not name:
+            return None
+        return {
+            "name": name,
+            "sector": info.get("sector", "N/A"),
+            "industry": info.get("industry", "N/A"),
+            "currency": info.get("currency"),
+        }
+
+    def get_fund_metadata(self, scheme_code):
+        """Fetches the scheme name for a mutual fund scheme code (None if unknown)."""
+        meta = get_json(MFAPI_URL.format(scheme_code)).get("meta") or {}
+        if not meta.get("scheme_name"):
+            return None
+        return {"name": meta["scheme_name"], "sector": "N/A", "industry": "N/A", "currency": "INR"}
+
+    def get_nav(self, scheme_code):
+        """Fetches the latest NAV for a mutual fund scheme code."""
+        data = get_json(MFAPI_URL.format(scheme_code))
+        if "data" in data and data["data"]:
+            return float(data["data"][0]["nav"])
+        return None
+
+    def get_nav_history(self, scheme_code):
+        """Streams a scheme's full mfapi history without holding the response in memory."""
+        with get_client().get(MFAPI_URL.format(scheme_code), stream=True, timeout=30) as response:
+            yield from iter_nav_history(response.iter_content(CHUNK_BYTES))
+
+    def get_nav_file(self, url):
+        """Streams the lines of an AMFI NAV file."""
+        with get_client().get(url, stream=True, timeout=30) as response:
+            yield from response.iter_lines(decode_unicode=True)
+
+    def get_fx_rate(self, base, quote):
+        """Fetches today's rate from exchangerate-api."""
+        data = get_json(FX_URL.format(base))
+        return round(data["rates"][quote], 2), data.get("date") or datetime.date.today().isoformat()
+
+
+class StubProvider(MarketDataProvider):
+    """Offline provider returning fixed prices, with optional simulated latency per request."""
+
+    def __init__(self, prices=None, default_price=100.0, latency=0.0, fx_rate=83.0):
+        self.prices = prices or {}
+        self.default_price = default_price
+        self.latency = latency
+        self.fx_rate = fx_rate
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_quotes(self, symbols):
+        self._call()
+        return {symbol: self.prices.get(symbol, self.default_price) for symbol in symbols}
+
+    def get_history(self, symbol, start, end):
+        self._call()
+        price = self.prices.get(symbol, self.default_price)
+        day, last = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+        bars = []
+        while day <= last:
+            if day.weekday() < 5:
+                bars.append((day.isoformat(), price, price, price, price, 0.0))
+            day += datetime.timedelta(days=1)
+        return bars
+
+    def get_metadata(self, symbol):
+        self._call()
+        return {"name": f"{symbol} Ltd.", "sector": "Technology", "industry": "Software", "currency": "USD"}
+
+    def get_fund_metadata(self, scheme_code):
+        self._call()
+        return {"name": f"Scheme {scheme_code}", "sector": "N/A", "industry": "N/A", "currency": "INR"}
+
+    def get_nav(self, scheme_code):
+        self._call()
+        return self.prices.get(scheme_code, self.default_price)
+
+    def get_nav_history(self, scheme_code):
+        self._call()
+        today = datetime.date.today()
+        nav = self.prices.get(scheme_code, self.default_price)
+        return iter([((today - datetime.timedelta(days=offset)).isoformat(), nav) for offset in range(365)])
+
+    def get_nav_file(self, url):
+        self._call()
+        today = datetime.date.today().strftime("%d-%b-%Y")
+        lines = ["Scheme Code;ISIN Div Payout/ ISIN Growth;ISIN Div Reinvestment;Scheme Name;Net Asset Value;Date"]
+        lines += [
+            f"{scheme_code};-;-;Scheme {scheme_code};{nav};{today}"
+            for scheme_code, nav in self.prices.items() if scheme_code.isdigit()
+        ]
+        return iter(lines)
+
+    def get_fx_rate(self, base, quote):
+        self._call()
+        return self.fx_rate, datetime.date.today().isoformat()
+
+
+def _load_fixtures(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+class RecordingProvider(MarketDataProvider):
+    """Wraps another provider and saves every response under `fixture_dir` for ReplayProvider.
+
+    Fixtures are one JSON file per method, keyed by the call's arguments;
+    quotes are stored per symbol so replays work with any batching. Responses
+    are buffered in memory and written by close() (also run at exit).
+    """
+
+    def __init__(self, inner, fixture_dir):
+        self.inner = inner
+        self.fixture_dir = fixture_dir
+        self.fixtures = {}
+        self.dirty = set()
+        self.lock = threading.Lock()
+        os.makedirs(fixture_dir, exist_ok=True)
+        atexit.register(self.close)
+
+    def _save(self, method, key, value):
+        with self.lock:
+            if method not in self.fixtures:  # Merge into what earlier recordings left on disk
+                self.fixtures[method] = _load_fixtures(os.path.join(self.fixture_dir, f"{method}.json"))
+            self.fixtures[method][key] = value
+            self.dirty.add(method)
+        return value
+
+    def close(self):
+        """Writes every method file that gained responses since the last close."""
+        with self.lock:
+            for method in sorted(self.dirty):
+                path = os.path.join(self.fixture_dir, f"{method}.json")
+                with open(path + ".tmp", "w") as handle:
+                    json.dump(self.fixtures[method], handle, indent=1, sort_keys=True)
+                os.replace(path + ".tmp", path)
+            self.dirty.clear()
+
+    def get_quotes(self, symbols):
+        quotes = self.inner.get_quotes(symbols)
+        for symbol, price in quotes.items():
+            self._save("get_quotes", symbol, price)
+        return quotes
+
+    def get_history(self, symbol, start, end):
+        bars = [list(bar) for bar in self.inner.get_history(symbol, start, end)]
+        return [tuple(bar) for bar in self._save("get_history", f"{symbol}|{start}|{end}", bars)]
+
+    def get_metadata(self, symbol):
+        return self._save("get_metadata", symbol, self.inner.get_metadata(symbol))
+
+    def get_fund_metadata(self, scheme_code):
+        return self._save("get_fund_metadata", scheme_code, self.inner.get_fund_metadata(scheme_code))
+
+    def get_nav(self, scheme_code):
+        return self._save("get_nav", scheme_code, self.inner.get_nav(scheme_code))
+
+    def get_nav_history(self, scheme_code):
+        history = [list(row) for row in self.inner.get_nav_history(scheme_code)]
+        return iter([tuple(row) for row in self._save("get_nav_history", scheme_code, history)])
+
+    def get_nav_file(self, url):
+        return iter(self._save("get_nav_file", url, list(self.inner.get_nav_file(url))))
+
+    def get_fx_rate(self, base, quote):
+        return tuple(self._save("get_fx_rate", f"{base}|{quote}", list(self.inner.get_fx_rate(base, quote))))
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serves responses recorded by RecordingProvider, with no network. Unrecorded calls raise LookupError."""
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+        self.fixtures = {}
+        self.lock = threading.Lock()
+
+    def _fixtures(self, method):
+        with self.lock:
+            if method not in self.fixtures:
+                self.fixtures[method] = _load_fixtures(os.path.join(self.fixture_dir, f"{method}.json"))
+            return self.fixtures[method]
+
+    def _get(self, method, key):
+        fixtures = self._fixtures(method)
+        if key not in fixtures:
+            raise LookupError(f"No recorded {method} response for {key}")
+        return fixtures[key]
+
+    def get_quotes(self, symbols):
+        quotes = self._fixtures("get_quotes")
+        return {symbol: quotes[symbol] for symbol in symbols if symbol in quotes}
+
+    def get_history(self, symbol, start, end):
+        return [tuple(bar) for bar in self._get("get_history", f"{symbol}|{start}|{end}")]
+
+    def get_metadata(self, symbol):
+        return self._get("get_metadata", symbol)
+
+    def get_fund_metadata(self, scheme_code):
+        return self._get("get_fund_metadata", scheme_code)
+
+    def get_nav(self, scheme_code):
+        return self._get("get_nav", scheme_code)
+
+    def get_nav_history(self, scheme_code):
+        return iter([tuple(row) for row in self._get("get_nav_history", scheme_code)])
+
+    def get_nav_file(self, url):
+        return iter(self._get("get_nav_file", url))
+
+    def get_fx_rate(self, base, quote):
+        return tuple(self._get("get_fx_rate", f"{base}|{quote}"))
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def provider_from_spec(spec):
+    """Builds a provider from "live", "replay:<dir>" or "record:<dir>" (live, saving every response)."""
+    kind, _, fixture_dir = (spec or "live").partition(":")
+    if kind == "live":
+        return YFinanceProvider()
+    if kind == "replay" and fixture_dir:
+        return ReplayProvider(fixture_dir)
+    if kind == "record" and fixture_dir:
+        return RecordingProvider(YFinanceProvider(), fixture_dir)
+    raise ValueError(f"Unknown provider {spec!r}; use live, replay:<dir> or record:<dir>")
+
+
+def _instrumented(provider):
+    return instrumentation.TimedProvider(provider) if instrumentation.ENABLED else provider
+
+
+def get_provider():
+    """Returns the process-wide provider, chosen by $PORTFOLIO_PROVIDER (default: live)."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = _instrumented(provider_from_spec(os.environ.get("PORTFOLIO_PROVIDER")))
+        return _provider
+
+
+def set_provider(provider):
+    """Replaces the process-wide provider, e.g. with a ReplayProvider or StubProvider for benchmarks."""
+    global _provider
+    with _provider_lock:
+        _provider = _instrumented(provider)
@@ -0,0 +1,319 @@
+import datetime
+
+import numpy as np
+
+from db import get_connection
+from fx import load_rate_table, lookup_rate
+
+RATE_BOUNDS = (-0.9999, 100.0)  # Annual rates searched; anything outside is reported as None
+TOLERANCE = 1e-10
+NEWTON_STEPS = 50
+BISECTION_STEPS = 200
+MEMO_SIZE = 50000
+
+_solved = {}    # cash-flow key -> rate, shared by every caller
+_results = {}   # (scope, item) -> (state it was computed from, result), e.g. ("goal", 3)
+
+
+def _years(dates):
+    """Year fractions (actual/365) from the first date, as XIRR counts them."""
+    days = np.array([datetime.date.fromisoformat(date).toordinal() for date in dates], dtype=float)
+    return (days - days.min()) / 365.0
+
+
+def _npv(rates, times, amounts):
+    return (amounts * (1.0 + rates[:, None]) ** -times).sum(axis=1)
+
+
+def xirr_many(flow_sets):
+    """Solves XIRR for many (dates, amounts) cash-flow series at once; None where there is no solution.
+
+    The series are padded into one matrix and Newton iterations run on every
+    row together. Rows that don't converge inside RATE_BOUNDS fall back to a
+    (likewise vectorized) bisection over the bracket. Results are memoized per
+    series, so unchanged flows are never solved twice.
+    """
+    keys = [(tuple(dates), tuple(round(amount, 6) for amount in amounts)) for dates, amounts in flow_sets]
+    pending = [key for key in dict.fromkeys(keys) if key not in _solved]
+    if pending:
+        width = max(len(dates) for dates, _ in pending)
+        times, amounts = np.zeros((len(pending), width)), np.zeros((len(pending), width))
+        for row, (dates, flows) in enumerate(pending):
+            times[row, :len(dates)] = _years(dates)
+            amounts[row, :len(flows)] = flows
+        solvable = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+
+        low, high = RATE_BOUNDS
+        rates = np.full(len(pending), 0.1)
+        done = ~solvable
+        with np.errstate(all="ignore"):
+            for _ in range(NEWTON_STEPS):
+                growth = (1.0 + rates[:, None]) ** -times
+                value = (amounts * growth).sum(axis=1)
+                slope = (-times * amounts * growth / (1.0 + rates[:, None])).sum(axis=1)
+                step = np.where(done, 0.0, value / slope)
+                rates = rates - step
+                done |= np.abs(step) < TOLERANCE
+                if done.all():
+                    break
+            failed = solvable & (~np.isfinite(rates) | (rates <= low) | (rates >= high) | ~done)
+
+            if failed.any():
+                lo, hi = np.full(failed.sum(), low), np.full(failed.sum(), high)
+                sub_times, sub_amounts = times[failed], amounts[failed]
+                lo_value = _npv(lo, sub_times, sub_amounts)
+                bracketed = np.sign(lo_value) != np.sign(_npv(hi, sub_times, sub_amounts))
+                for _ in range(BISECTION_STEPS):
+                    mid = (lo + hi) / 2
+                    mid_value = _npv(mid, sub_times, sub_amounts)
+                    same = np.sign(mid_value) == np.sign(lo_value)
+                    lo, lo_value = np.where(same, mid, lo), np.where(same, mid_value, lo_value)
+                    hi = np.where(same, hi, mid)
+                rates[failed] = np.where(bracketed, (lo + hi) / 2, np.nan)
+
+        if len(_solved) + len(pending) > MEMO_SIZE:
+            _solved.clear()
+        for key, rate, ok in zip(pending, rates, solvable):
+            _solved[key] = float(rate) if ok and np.isfinite(rate) else None
+    return [_solved[key] for key in keys]
+
+
+def xirr(dates, amounts):
+    """Annualized internal rate of return of dated cash flows (negative = invested), or None."""
+    return xirr_many([(dates, amounts)])[0]
+
+
+def cagr(start_value, end_value, days):
+    """Compound annual growth rate between two values `days` apart, or None."""
+    if not start_value or days <= 0 or end_value / start_value <= 0:
+        return None
+    return (end_value / start_value) ** (365.0 / days) - 1
+
+
+def _changed(scope, states):
+    """Items whose current state differs from the one their cached result was computed from."""
+    return [item for item, state in states.items() if _results.get((scope, item), (None,))[0] != state]
+
+
+def _rows_in(cursor, query, ids, *params):
+    """Runs `query` for `ids` (its `{ids}` placeholder) in chunks under SQLite's bound-parameter limit."""
+    ids, rows = list(ids), []
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        cursor.execute(query.format(ids=", ".join("?" * len(chunk))), (*params, *chunk))
+        rows += cursor.fetchall()
+    return rows
+
+
+def _merge(flows):
+    """Sums same-day flows and returns them as (dates, amounts), oldest first."""
+    by_date = {}
+    for date, amount in flows:
+        by_date[date] = by_date.get(date, 0.0) + amount
+    dates = sorted(by_date)
+    return dates, [by_date[date] for date in dates]
+
+
+def _price_on(cursor, symbol, date):
+    cursor.execute(
+        "SELECT price FROM price_history WHERE symbol = ? AND date <= ? ORDER BY date DESC LIMIT 1", (symbol, date)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _solve_holdings(cursor, symbols, states, as_of, rate_table):
+    """Rebuilds the cash flows of the given symbols from the ledger and solves their XIRRs together."""
+    holdings = {}
+    for symbol, date, kind, units, price, amount in _rows_in(cursor, """
+        SELECT symbol, date, kind, units, price, amount FROM transactions
+        WHERE date <= ? AND symbol IN ({ids}) ORDER BY symbol, date, id
+    """, symbols, as_of):
+        holding = holdings.setdefault(symbol, {"units": 0.0, "flows": []})
+        if kind == "BUY":
+            holding["units"] += units
+            holding["flows"].append((date, -units * price))
+        elif kind == "SELL":
+            holding["units"] -= units
+            holding["flows"].append((date, units * price))
+        elif kind == "DIVIDEND":
+            holding["flows"].append((date, amount))
+        elif kind == "SPLIT":
+            holding["units"] *= units
+
+    solvable = []
+    for symbol in symbols:
+        state = states[symbol]
+        investment_type, currency, price = state[1][0], state[1][1], state[2]
+        holding = holdings.get(symbol, {"units": 0.0, "flows": []})
+        units = holding["units"] if holding["units"] > 1e-9 else 0.0
+        value = units * price if price is not None else (0.0 if not units else None)
+        row = {"symbol": symbol, "investment_type": investment_type, "currency": currency,
+               "units": units, "value": value, "xirr": None, "inr_flows": None}
+        if value is not None:
+            flows = holding["flows"] + [(as_of, value)]
+            to_inr = (lambda date: lookup_rate(rate_table, date)) if currency == "USD" else (lambda date: 1)
+            row["inr_flows"] = [(date, amount * to_inr(date)) for date, amount in flows]
+            solvable.append((row, _merge(flows)))
+        _results[("holding", symbol)] = (state, row)
+    for (row, _), rate in zip(solvable, xirr_many([series for _, series in solvable])):
+        row["xirr"] = rate
+
+
+def holding_returns(as_of=None, prices=None, conn=None):
+    """XIRR per ledger holding (native currency) and for the whole portfolio (INR), as of a day.
+
+    Open units are valued at `prices` (symbol -> price, e.g. live quotes) or
+    the last stored price on or before `as_of`. Each holding's result is kept
+    until its transactions, price or (for USD) FX rates change, so a rerun
+    only rebuilds and solves the holdings that moved. Returns (rows, portfolio summary).
+    """
+    conn = conn or get_connection()
+    cursor = conn.cursor()
+    as_of = as_of or datetime.date.today().isoformat()
+    prices = prices or {}
+
+    cursor.execute("""
+        SELECT symbol, investment_type, currency, COUNT(*), MAX(id), TOTAL(units), TOTAL(price), TOTAL(amount)
+        FROM transactions WHERE date <= ? GROUP BY symbol
+    """, (as_of,))
+    rate_table = load_rate_table(conn=conn)
+    fx_state = (len(rate_table[0]), tuple(rate_table[0][-1:]), tuple(rate_table[1][-1:]))
+    states = {}
+    for symbol, *summary in cursor.fetchall():
+        price = prices.get(symbol)
+        if price is None:
+            price = _price_on(cursor, symbol, as_of)
+        states[symbol] = (as_of, tuple(summary), price, fx_state if summary[1] == "USD" else None)
+
+    changed = _changed("holding", states)
+    if changed:
+        _solve_holdings(cursor, changed, states, as_of, rate_table)
+    holdings = [_results[("holding", symbol)][1] for symbol in sorted(states)]
+
+    portfolio_state = tuple(states[symbol] for symbol in sorted(states))
+    cached = _results.get(("portfolio", as_of))
+    if cached and cached[0] == portfolio_state:
+        portfolio = cached[1]
+    else:
+        flows = [flow for holding in holdings if holding["inr_flows"] for flow in holding["inr_flows"]]
+        as_of_rate = lookup_rate(rate_table, as_of)
+        portfolio = {
+            "as_of": as_of,
+            "xirr": xirr(*_merge(flows)) if flows else None,
+            "invested": -sum(amount for _, amount in flows if amount < 0),
+            "value": sum(holding["value"] * (as_of_rate if holding["currency"] == "USD" else 1)
+                         for holding in holdings if holding["value"] is not None),
+            "unpriced": [holding["symbol"] for holding in holdings if holding["value"] is None],
+        }
+        _results[("portfolio", as_of)] = (portfolio_state, portfolio)
+
+    rows = [{key: value for key, value in holding.items() if key != "inr_flows"} for holding in holdings]
+    return rows, portfolio
+
+
+def _deadline(created, horizon):
+    created_on = datetime.date.fromisoformat(created)
+    try:
+        return created_on.replace(year=created_on.year + horizon).isoformat()
+    except ValueError:  # Created on 29 February
+        return created_on.replace(year=created_on.year + horizon, day=28).isoformat()
+
+
+def goal_returns(as_of=None, conn=None):
+    """Per goal: invested amount, actual XIRR (from its recorded current value) and the return still required.
+
+    Rates are fractions (0.12 = 12%); expected_cagr stays in percent as stored.
+    A goal is recomputed only when it or its contributions change, and all
+    changed goals are solved in one vectorized pass.
+    """
+    conn = conn or get_connection()
+    cursor = conn.cursor()
+    as_of = as_of or datetime.date.today().isoformat()
+    cursor.execute("""
+        SELECT id, name, target_amount, time_horizon, expected_cagr, goal_creation_date, current_value, valued_on
+        FROM goals ORDER BY id
+    """)
+    goals = {goal[0]: goal for goal in cursor.fetchall()}
+    cursor.execute("""
+        SELECT goal_id, COUNT(*), MAX(id), TOTAL(amount) FROM goal_investments
+        WHERE investment_date <= ? GROUP BY goal_id
+    """, (as_of,))
+    sums = {row[0]: row[1:] for row in cursor.fetchall()}
+    states = {goal_id: (as_of, goal, sums.get(goal_id)) for goal_id, goal in goals.items()}
+
+    changed = _changed("goal", states)
+    if changed:
+        contributions = {}
+        for goal_id, date, amount in _rows_in(cursor, """
+            SELECT goal_id, investment_date, amount FROM goal_investments
+            WHERE investment_date <= ? AND goal_id IN ({ids}) ORDER BY goal_id, investment_date
+        """, changed, as_of):
+            contributions.setdefault(goal_id, []).append((date, -amount))
+
+        actual, required, rows = [], [], []
+        for goal_id in changed:
+            _, name, target, horizon, expected, created, value, valued_on = goals[goal_id]
+            flows = contributions.get(goal_id, [])
+            deadline = _deadline(created, horizon)
+            rows.append({
+                "id": goal_id, "name": name, "target_amount": target, "deadline": deadline,
+                "expected_cagr": expected, "invested": -sum(amount for _, amount in flows), "current_value": value,
+            })
+            actual.append(_merge(flows + [(valued_on or as_of, value)]) if value is not None and flows else None)
+            # Rate the money invested so far must earn, with no further contributions, to reach the target in time
+            required.append(_merge(flows + [(deadline, target)]) if flows and deadline > as_of else None)
+
+        solved_actual = iter(xirr_many([series for series in actual if series]))
+        solved_required = iter(xirr_many([series for series in required if series]))
+        for goal_id, row, has_actual, has_required in zip(changed, rows, actual, required):
+            row["xirr"] = next(solved_actual) if has_actual else None
+            row["required_cagr"] = next(solved_required) if has_required else None
+            row["on_track"] = (row["xirr"] * 100 >= row["expected_cagr"]
+                               if row["xirr"] is not None and row["expected_cagr"] is not None else None)
+            _results[("goal", goal_id)] = (states[goal_id], row)
+    return [_results[("goal", goal_id)][1] for goal_id in goals]
+
+
+def time_weighted_return(start=None, end=None, conn=None):
+    """Time-weighted return of the portfolio over [start, end] from daily snapshots, neutralising cash flows.
+
+    Flows come from the ledger with the XIRR signs (buys negative, sales and
+    dividends positive). Trades happen at the day's price, so each day's
+    return is (value + flows since) / previous value; the chain is compounded,
+    and annualized for periods over a year. Returns a dict, or None with fewer
+    than two snapshots in the range.
+    """
+    conn = conn or get_connection()
+    cursor = conn.cursor()
+    end = end or datetime.date.today().isoformat()
+    cursor.execute("""
+        SELECT date, total_value FROM portfolio_history
+        WHERE date >= ? AND date <= ? AND total_value > 0 ORDER BY date
+    """, (start or "0000-00-00", end))
+    snapshots = cursor.fetchall()
+    if len(snapshots) < 2:
+        return None
+    dates = [row[0] for row in snapshots]
+    values = np.array([row[1] for row in snapshots])
+
+    cursor.execute("""
+        SELECT date, currency, TOTAL(CASE kind WHEN 'BUY' THEN -units * price
+                                               WHEN 'SELL' THEN units * price ELSE amount END)
+        FROM transactions
+        WHERE date > ? AND date <= ? AND kind IN ('BUY', 'SELL', 'DIVIDEND')
+        GROUP BY date, currency
+    """, (dates[0], dates[-1]))
+    rate_table = load_rate_table(conn=conn)
+    flows = np.zeros(len(dates))
+    for date, currency, amount in cursor.fetchall():
+        # A flow counts towards the first snapshot on or after its date
+        flows[np.searchsorted(dates, date)] += amount * (lookup_rate(rate_table, date) if currency == "USD" else 1)
+
+    daily = (values[1:] + flows[1:]) / values[:-1]
+    total = float(np.prod(daily) - 1)
+    days = (datetime.date.fromisoformat(dates[-1]) - datetime.date.fromisoformat(dates[0])).days
+    return {
+        "from": dates[0], "to": dates[-1], "twr": total,
+        "annualized": (1 + total) ** (365.0 / days) - 1 if days > 365 else None,
+    }
@@ -0,0 +1,341 @@
+import datetime
+import json
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+from db import get_connection
+from fx import load_rate_table, lookup_rate
+from returns import _rows_in
+from timeseries import _forward_fill
+
+WINDOW_DAYS = 252           # Trading days of returns behind every estimate
+TRADING_DAYS = 252          # Used to annualize daily volatility
+CONFIDENCE = (0.95, 0.99)
+BENCHMARK = "^NSEI"
+RESUM_EVERY = 250           # Incremental updates before the moments are re-summed from the stored window
+
+_windows = {}               # (database path, window) -> (RiskWindow, source mark it is current with)
+
+
+def holding_values(conn):
+    """Current INR value of each held symbol at its latest stored price, as {symbol: value}."""
+    usd_rate = lookup_rate(load_rate_table(conn=conn), datetime.date.today().isoformat())
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT p.symbol, SUM(p.units) * lp.price * CASE WHEN p.currency = 'USD' THEN ? ELSE 1 END
+        FROM portfolio p JOIN latest_price lp ON lp.symbol = p.symbol
+        GROUP BY p.symbol
+        HAVING SUM(p.units) > 0
+    """, (usd_rate,))
+    return dict(cursor.fetchall())
+
+
+def _load_prices(conn, symbols, after, through):
+    """Prices for dates in (after, through] as (dates, dates × symbols matrix with NaN where missing).
+
+    Cached ohlc_bars closes fill the days price_history lacks (e.g. a benchmark
+    index or history from before the first refresh); price_history wins on overlap.
+    """
+    import pandas as pd
+
+    cursor = conn.cursor()
+    frames = []
+    for query in (
+        "SELECT symbol, date, close FROM ohlc_bars WHERE date > ? AND date <= ? AND symbol IN ({ids})",
+        "SELECT symbol, date, price FROM price_history WHERE date > ? AND date <= ? AND symbol IN ({ids})",
+    ):
+        frames.append(pd.DataFrame.from_records(_rows_in(cursor, query, symbols, after, through),
+                                                columns=["symbol", "date", "price"]))
+    frame = pd.concat(frames, ignore_index=True)
+    if frame.empty:
+        return [], np.empty((0, len(symbols)))
+    date_codes, dates = pd.factorize(frame["date"], sort=True)
+    matrix = np.full((len(dates), len(symbols)), np.nan)
+    # Later rows (price_history) overwrite earlier ones (ohlc_bars) on the same cell
+    matrix[date_codes, pd.Index(symbols).get_indexer(frame["symbol"])] = frame["price"].to_numpy(dtype=float)
+    return list(dates), matrix
+
+
+def _daily_returns(prices):
+    """Simple returns between consecutive rows; NaN until a symbol has a price on both days."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return prices[1:] / prices[:-1] - 1
+
+
+def _moments(returns):
+    """Pairwise-complete running sums: counts[i, j] days both observed, sums[i, j] sum of i's returns on
+    those days, products[i, j] sum of i × j."""
+    observed = (~np.isnan(returns)).astype(float)
+    filled = np.nan_to_num(returns)
+    return observed.T @ observed, filled.T @ observed, filled.T @ filled
+
+
+def _source_mark(conn, symbols):
+    """What the stored window was built from: the last price_history id and each symbol's ohlc coverage."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM price_history")
+    last_id = cursor.fetchone()[0]
+    coverage = _rows_in(cursor, """
+        SELECT symbol, first_date, last_date, checked_on FROM ohlc_coverage WHERE symbol IN ({ids})
+    """, symbols)
+    return {"last_id": last_id, "ohlc": {symbol: list(dates) for symbol, *dates in coverage}}
+
+
+class RiskWindow:
+    """Forward-filled prices for the last `window` trading days of a symbol set, with the return moments.
+
+    Adding a day costs one rank update of the N × N moment matrices, and the
+    day leaving the window is subtracted the same way, so the covariance is
+    never recomputed from scratch on a normal daily update.
+    """
+
+    def __init__(self, symbols, window, dates, prices, moments=None, updates=0):
+        self.symbols = list(symbols)
+        self.window = window
+        self.dates = list(dates)
+        self.prices = prices
+        self.counts, self.sums, self.products = moments or _moments(_daily_returns(prices))
+        self.updates = updates
+
+    @property
+    def returns(self):
+        return _daily_returns(self.prices)
+
+    def _apply(self, returns, sign):
+        counts, sums, products = _moments(returns)
+        self.counts += sign * counts
+        self.sums += sign * sums
+        self.products += sign * products
+
+    def extend(self, dates, prices):
+        """Appends new days (NaN = no price that day) and drops the days that fall out of the window."""
+        if not len(dates):
+            return
+        filled = _forward_fill(np.vstack([self.prices[-1:], prices]))
+        self._apply(_daily_returns(filled), 1)
+        self.prices = np.vstack([self.prices, filled[1:]])
+        self.dates += list(dates)
+        excess = len(self.dates) - 1 - self.window
+        if excess > 0:
+            self._apply(_daily_returns(self.prices[:excess + 1]), -1)
+            self.prices = self.prices[excess:]
+            self.dates = self.dates[excess:]
+        self.updates += 1
+        if self.updates >= RESUM_EVERY:  # Bound the float drift of repeated add/subtract
+            self.counts, self.sums, self.products = _moments(self.returns)
+            self.updates = 0
+
+    def truncate(self, date):
+        """Drops the days on or after `date` so they can be reloaded; False if nothing would be left."""
+        keep = sum(1 for day in self.dates if day < date)
+        if keep < 1:
+            return False
+        if keep < len(self.dates):
+            self._apply(_daily_returns(self.prices[keep - 1:]), -1)
+            self.prices = self.prices[:keep]
+            self.dates = self.dates[:keep]
+        return True
+
+    def covariance(self):
+        """Daily covariance matrix from the running sums (NaN for pairs with fewer than two shared days)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = (self.products - self.sums * self.sums.T / self.counts) / (self.counts - 1)
+        return np.where(self.counts > 1, cov, np.nan)
+
+    def means(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.diag(self.sums) / np.diag(self.counts)
+
+
+def window_start(window, through=None):
+    """A day far enough before `through` (default: today) to cover `window` trading days plus one prior price."""
+    through = datetime.date.fromisoformat(through) if through else datetime.date.today()
+    return (through - datetime.timedelta(days=window * 7 // 5 + 21)).isoformat()
+
+
+def _build(conn, symbols, window, through):
+    after = window_start(window, through)  # Shorter histories just give a shorter window
+    dates, prices = _load_prices(conn, symbols, after, through)
+    prices = _forward_fill(prices)[-(window + 1):] if len(dates) else np.full((1, len(symbols)), np.nan)
+    return RiskWindow(symbols, window, dates[-(window + 1):] or [after], prices)
+
+
+def _pack(matrix, dtype=np.float64):
+    """Upper triangle of a symmetric matrix as bytes (half the size of the full matrix)."""
+    return matrix[np.triu_indices(len(matrix))].astype(dtype).tobytes()
+
+
+def _unpack(blob, n, dtype=np.float64):
+    rows, cols = np.triu_indices(n)
+    matrix = np.empty((n, n))
+    matrix[rows, cols] = matrix[cols, rows] = np.frombuffer(blob, dtype)
+    return matrix
+
+
+def _load_state(conn, window):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT symbols, dates, source_mark, prices, counts, sums, products, updates
+        FROM risk_state WHERE window_days = ?
+    """, (window,))
+    row = cursor.fetchone()
+    if row is None:
+        return None, None
+    symbols, dates = json.loads(row[0]), json.loads(row[1])
+    n = len(symbols)
+    prices = np.frombuffer(row[3]).reshape(len(dates), n).copy()
+    moments = (_unpack(row[4], n, np.uint32), np.frombuffer(row[5]).reshape(n, n).copy(), _unpack(row[6], n))
+    return RiskWindow(symbols, window, dates, prices, moments, row[7]), json.loads(row[2])
+
+
+def _save_state(conn, state, mark):
+    with conn:
+        conn.execute("""
+            REPLACE INTO risk_state (window_days, symbols, dates, source_mark, prices, counts, sums, products, updates)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (state.window, json.dumps(state.symbols), json.dumps(state.dates), json.dumps(mark),
+              state.prices.tobytes(), _pack(state.counts, np.uint32), state.sums.tobytes(), _pack(state.products),
+              state.updates))
+
+
+def _resume_from(conn, state, old, new):
+    """Earliest stored day whose prices may have changed since `old` was taken ("" = none, None = rebuild)."""
+    # A price is never updated in place: REPLACE gives the row a new id, so new ids cover every change
+    cursor = conn.cursor()
+    cursor.execute("SELECT symbol, date FROM price_history WHERE id > ?", (old["last_id"],))
+    universe = set(state.symbols)
+    changed = [date for symbol, date in cursor.fetchall() if symbol in universe]
+    for symbol, coverage in new["ohlc"].items():
+        before = old["ohlc"].get(symbol)
+        if before is None or coverage[0] < before[0]:
+            return None  # New or extended older history: the window's earliest prices may change
+        if coverage != before:
+            changed.append(before[1])  # A top-up re-fetches the previous last bar too (bar_cache.get_bars)
+    return min(changed, default="")
+
+
+def update_window(conn, symbols, window=WINDOW_DAYS):
+    """Brings the stored risk window for `symbols` up to today and returns it.
+
+    Days after the stored window are appended incrementally. A late or
+    corrected price inside the window rolls back just the days from that price
+    on; a different symbol set or newly cached older history rebuilds it. The
+    window is also kept in memory, so later calls in the same process skip
+    reading it back, and it is only written when something changed.
+    """
+    symbols = sorted(set(symbols))
+    today = datetime.date.today().isoformat()
+    key = (conn.execute("PRAGMA database_list").fetchone()[2], window)
+    mark = _source_mark(conn, symbols)
+    state, old = _windows.get(key) or _load_state(conn, window)
+
+    start = None
+    if state is not None and state.symbols == symbols:
+        start = _resume_from(conn, state, old, mark)
+    if start is None or (start and not state.truncate(start)):
+        state = _build(conn, symbols, window, today)
+        _save_state(conn, state, mark)
+    else:
+        dates, prices = _load_prices(conn, symbols, state.dates[-1], today)
+        if start or len(dates):
+            state.extend(dates, prices)
+            _save_state(conn, state, mark)
+    _windows[key] = (state, mark)  # Stays valid in memory even when nothing needed saving
+    return state
+
+
+def _weighted_returns(returns, weights):
+    """Daily portfolio returns, renormalizing the weights over the symbols priced on each day.
+
+    Days with none of the holdings priced yet are NaN.
+    """
+    day_weights = np.where(np.isnan(returns), 0.0, weights)
+    totals = day_weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (np.nan_to_num(returns) * day_weights).sum(axis=1) / np.where(totals > 0, totals, np.nan)
+
+
+def _drawdown(dates, series):
+    """Largest peak-to-trough fall of the compounded daily `series` (dates[i + 1] is day i), and the current one."""
+    index = np.concatenate([[1.0], np.cumprod(1 + np.nan_to_num(series))])
+    drawdowns = index / np.maximum.accumulate(index) - 1
+    trough = int(drawdowns.argmin())
+    peak = int(index[:trough + 1].argmax())
+    return {"max": float(drawdowns[trough]), "peak": dates[peak], "trough": dates[trough],
+            "current": float(drawdowns[-1])}
+
+
+def portfolio_risk(window=WINDOW_DAYS, benchmark=BENCHMARK, conn=None):
+    """Volatility, VaR, drawdown, beta and correlations of the current holdings over the last `window` days.
+
+    Weights are current INR values. VaR and expected shortfall are one-day
+    INR losses at each CONFIDENCE level, historical (from the window's
+    portfolio returns) and parametric (normal, from the covariance matrix).
+    Beta is against `benchmark` (from price_history or the ohlc_bars cache).
+    Returns (rows, summary); rows are per holding.
+    """
+    conn = conn or get_connection()
+    values = holding_values(conn)
+    symbols = sorted(set(values) | ({benchmark} if benchmark else set()))
+    state = update_window(conn, symbols, window)
+
+    cov = state.covariance()
+    variances = np.diag(cov)
+    held = np.array([symbol in values and variances[i] > 0 for i, symbol in enumerate(symbols)], dtype=bool)
+    measured = [symbol for symbol, used in zip(symbols, held) if used]
+    value = sum(values[symbol] for symbol in measured)
+    summary = {
+        "as_of": state.dates[-1], "window": window, "days": len(state.dates) - 1, "value": value,
+        "unmeasured": sorted(set(values) - set(measured)), "benchmark": benchmark,
+    }
+    if not measured:
+        return [], summary
+
+    weights = np.where(held, [values.get(symbol, 0.0) / value for symbol in symbols], 0.0)
+    marginal = np.nan_to_num(cov) @ weights  # Pairs with fewer than two shared days count as uncorrelated
+    variance = float(weights @ marginal)
+    mean = float(np.nansum(weights * state.means()))
+    daily_vol = math.sqrt(variance)
+    series = _weighted_returns(state.returns[:, held], weights[held])
+    observed = series[~np.isnan(series)]
+
+    var = {}
+    for level in CONFIDENCE:
+        z = NormalDist().inv_cdf(1 - level)
+        row = {
+            "parametric": max(0.0, -(mean + z * daily_vol)) * value,
+            "parametric_shortfall": max(0.0, daily_vol * NormalDist().pdf(z) / (1 - level) - mean) * value,
+            "historical": None, "historical_shortfall": None,
+        }
+        if len(observed):
+            cutoff = np.quantile(observed, 1 - level)
+            row["historical"] = max(0.0, -cutoff) * value
+            row["historical_shortfall"] = max(0.0, -observed[observed <= cutoff].mean()) * value
+        var[f"{level:.0%}"] = row
+
+    b = symbols.index(benchmark) if benchmark else None
+    has_benchmark = b is not None and variances[b] > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        betas = cov[:, b] / variances[b] if has_benchmark else np.full(len(symbols), np.nan)
+        stdev = np.sqrt(np.where(variances > 0, variances, np.nan))
+        correlation = np.clip(cov / np.outer(stdev, stdev), -1, 1)
+    np.fill_diagonal(correlation, 1.0)
+
+    summary.update({
+        "volatility": daily_vol * math.sqrt(TRADING_DAYS),
+        "daily_volatility": daily_vol,
+        "mean_daily_return": mean,
+        "var": var,
+        "drawdown": _drawdown(state.dates, series),
+        "beta": float(np.nansum(weights * betas)) if has_benchmark else None,
+        "correlation": {"symbols": measured, "matrix": correlation[np.ix_(held, held)].round(4).tolist()},
+    })
+    rows = [{
+        "symbol": symbol, "value": values[symbol], "weight": weights[i],
+        "volatility": stdev[i] * math.sqrt(TRADING_DAYS),
+        "beta": betas[i] if has_benchmark else None,
+        "risk_contribution": weights[i] * marginal[i] / variance if variance > 0 else None,
+    } for i, symbol in enumerate(symbols) if held[i]]
+    return rows, summary
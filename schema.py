@@ -0,0 +1,87 @@
+PRICE_HISTORY_DDL = """
+    CREATE TABLE IF NOT EXISTS price_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT NOT NULL,
+        date TEXT NOT NULL,
+        price REAL NOT NULL,
+        UNIQUE(symbol, date) ON CONFLICT REPLACE
+    )
+"""
+
+# Covering index: latest/previous/range lookups per symbol never touch the table
+PRICE_HISTORY_INDEX_DDL = """
+    CREATE INDEX IF NOT EXISTS idx_price_history_symbol_date
+    ON price_history (symbol, date, price)
+"""
+
+# One row per symbol holding its two most recent prices
+LATEST_PRICE_DDL = """
+    CREATE TABLE IF NOT EXISTS latest_price (
+        symbol TEXT PRIMARY KEY,
+        date TEXT NOT NULL,
+        price REAL NOT NULL,
+        prev_date TEXT,
+        prev_price REAL
+    ) WITHOUT ROWID
+"""
+
+_RECOMPUTE_LATEST = """
+        DELETE FROM latest_price WHERE symbol = {sym};
+        INSERT INTO latest_price (symbol, date, price, prev_date, prev_price)
+        SELECT cur.symbol, cur.date, cur.price, prev.date, prev.price
+        FROM (SELECT symbol, date, price FROM price_history
+              WHERE symbol = {sym} ORDER BY date DESC LIMIT 1) cur
+        LEFT JOIN (SELECT date, price FROM price_history
+                   WHERE symbol = {sym} ORDER BY date DESC LIMIT 1 OFFSET 1) prev ON 1;
+"""
+
+LATEST_PRICE_TRIGGERS = (
+    # Inserts (including REPLACE) shift the current price into prev when a newer date lands,
+    # overwrite it on the same date, or fill prev when an older date is backfilled.
+    # (No OR IGNORE here: a REPLACE on price_history would override it to REPLACE.)
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_price_history_insert AFTER INSERT ON price_history
+    BEGIN
+        INSERT INTO latest_price (symbol, date, price)
+        SELECT NEW.symbol, NEW.date, NEW.price
+        WHERE NOT EXISTS (SELECT 1 FROM latest_price WHERE symbol = NEW.symbol);
+        UPDATE latest_price SET prev_date = date, prev_price = price, date = NEW.date, price = NEW.price
+        WHERE symbol = NEW.symbol AND date < NEW.date;
+        UPDATE latest_price SET price = NEW.price
+        WHERE symbol = NEW.symbol AND date = NEW.date;
+        UPDATE latest_price SET prev_date = NEW.date, prev_price = NEW.price
+        WHERE symbol = NEW.symbol AND date > NEW.date AND (prev_date IS NULL OR prev_date <= NEW.date);
+    END
+    """,
+    # Explicit deletes and updates are rare, so just recompute that symbol from the index
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_price_history_delete AFTER DELETE ON price_history
+    BEGIN
+        {_RECOMPUTE_LATEST.format(sym="OLD.symbol")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_price_history_update AFTER UPDATE OF symbol, date, price ON price_history
+    BEGIN
+        {_RECOMPUTE_LATEST.format(sym="OLD.symbol")}
+        {_RECOMPUTE_LATEST.format(sym="NEW.symbol")}
+    END
+    """,
+)
+
+
+def rebuild_latest_price(conn):
+    """Repopulates latest_price from price_history in a single pass (caller commits)."""
+    conn.execute("DELETE FROM latest_price")
+    conn.execute("""
+        INSERT INTO latest_price (symbol, date, price, prev_date, prev_price)
+        SELECT symbol, date, price, prev_date, prev_price FROM (
+            SELECT symbol, date, price,
+                   LEAD(date) OVER w AS prev_date,
+                   LEAD(price) OVER w AS prev_price,
+                   ROW_NUMBER() OVER w AS rn
+            FROM price_history
+            WINDOW w AS (PARTITION BY symbol ORDER BY date DESC)
+        )
+        WHERE rn = 1
+    """)
@@ -0,0 +1,89 @@
+import time
+
+from db import get_connection
+from providers import get_provider
+
+_COLUMNS = ("symbol", "investment_type", "name", "sector", "industry", "currency", "fetched_at")
+
+
+def lot_currency(investment_type, symbol):
+    """Currency a lot is held in: mutual funds and NSE/BSE listings are INR, other stocks USD."""
+    if investment_type == "Mutual Fund" or symbol.endswith((".NS", ".BO")):
+        return "INR"
+    return "USD"
+
+
+def get_cached_security(symbol):
+    """Returns the cached metadata dict for a symbol, or None. Never touches the network."""
+    cursor = get_connection().cursor()
+    cursor.execute(f"SELECT {', '.join(_COLUMNS)} FROM securities WHERE symbol = ?", (symbol,))
+    row = cursor.fetchone()
+    return dict(zip(_COLUMNS, row)) if row else None
+
+
+def get_cached_securities(symbols):
+    """Returns symbol -> metadata dict for every given symbol present in the cache."""
+    symbols = list(dict.fromkeys(symbols))
+    cursor = get_connection().cursor()
+    found = {}
+    for start in range(0, len(symbols), 500):
+        chunk = symbols[start:start + 500]
+        cursor.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM securities WHERE symbol IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        for row in cursor.fetchall():
+            found[row[0]] = dict(zip(_COLUMNS, row))
+    return found
+
+
+def store_security(symbol, investment_type, metadata, commit=True):
+    """Upserts provider metadata for a symbol and returns the cached record.
+
+    With commit=False the row joins the caller's open transaction (for batched writers).
+    """
+    record = {
+        "symbol": symbol,
+        "investment_type": investment_type,
+        "name": metadata.get("name"),
+        "sector": metadata.get("sector") or "N/A",
+        "industry": metadata.get("industry") or "N/A",
+        "currency": metadata.get("currency"),
+        "fetched_at": time.time(),
+    }
+    conn = get_connection()
+    conn.execute(
+        f"REPLACE INTO securities ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+        tuple(record[column] for column in _COLUMNS),
+    )
+    if commit:
+        conn.commit()
+    return record
+
+
+def fetch_metadata(symbol, investment_type="Stock", provider=None):
+    """One provider call for a symbol's metadata, without touching the cache (None if unknown)."""
+    provider = provider or get_provider()
+    if investment_type == "Mutual Fund":
+        return provider.get_fund_metadata(symbol)
+    return provider.get_metadata(symbol)
+
+
+def get_security(symbol, investment_type="Stock", provider=None, max_age=None):
+    """Returns name/sector/industry/currency for a symbol, fetching it with one provider call on a cache miss.
+
+    Returns None when the provider doesn't know the symbol, which doubles as
+    symbol validation. `max_age` (seconds) forces a refetch of older entries.
+    """
+    cached = get_cached_security(symbol)
+    if cached and (max_age is None or cached["fetched_at"] + max_age > time.time()):
+        return cached
+
+    try:
+        metadata = fetch_metadata(symbol, investment_type, provider)
+    except Exception as e:
+        print(f"⚠️ Error fetching details for {symbol}: {e}")
+        return cached  # A stale entry beats nothing
+
+    if not metadata:
+        return None
+    return store_security(symbol, investment_type, metadata)
@@ -0,0 +1,152 @@
+import datetime
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from db import get_connection
+from returns import _deadline
+from risk import _weighted_returns, holding_values
+
+BLOCK_PATHS = 25000         # Paths per random stream; fixed so results don't depend on the worker count
+LOOKBACK_DAYS = 3 * 365     # Price history used to estimate drift and volatility
+MIN_RETURN_DAYS = 60
+
+
+def estimate_parameters(conn=None, lookback_days=LOOKBACK_DAYS):
+    """Annualized drift and volatility of log returns of the current holdings, from stored prices.
+
+    Each held symbol's daily returns over the lookback window are weighted by
+    its current INR value (renormalized on days where some symbols have no
+    price). Returns (mu, sigma, trading days used), or None without enough history.
+    """
+    import pandas as pd
+
+    conn = conn or get_connection()
+    start = (datetime.date.today() - datetime.timedelta(days=lookback_days)).isoformat()
+    weights = pd.Series(holding_values(conn), dtype=float)
+    if weights.empty:
+        return None
+
+    prices = pd.read_sql_query(f"""
+        SELECT symbol, date, price FROM price_history
+        WHERE date >= ? AND symbol IN ({", ".join("?" * len(weights))})
+    """, conn, params=(start, *weights.index)).pivot(index="date", columns="symbol", values="price").sort_index()
+    daily = np.log(prices.ffill()).diff().iloc[1:]  # A missing day's move lands on the next priced day
+    if len(daily) < MIN_RETURN_DAYS:
+        return None
+
+    portfolio = _weighted_returns(daily.to_numpy(), weights.reindex(daily.columns).to_numpy())
+    portfolio = portfolio[~np.isnan(portfolio)]
+
+    span_years = (pd.Timestamp(daily.index[-1]) - pd.Timestamp(prices.index[0])).days / 365.25
+    periods = len(portfolio) / span_years if span_years > 0 else 252
+    return float(portfolio.mean() * periods), float(portfolio.std(ddof=1) * math.sqrt(periods)), len(portfolio)
+
+
+def _simulate_block(task):
+    """Runs one block of paths with its own random stream; returns the final values."""
+    seed, paths, months, start_value, contribution, mu, sigma = task
+    rng = np.random.default_rng(seed)
+    dt = 1 / 12
+    drift, shock = mu * dt, sigma * math.sqrt(dt)  # mu is already a log-return drift
+    values = np.full(paths, float(start_value))
+    for _ in range(months):
+        values += contribution
+        values *= np.exp(drift + shock * rng.standard_normal(paths))
+    return values
+
+
+def simulate_paths(start_value, contribution, months, mu, sigma, paths=100000, seed=None, workers=1):
+    """Final values of `paths` lognormal monthly paths (contribution added at the start of each month).
+
+    `mu` is the annual drift of log returns (as estimate_parameters() gives it)
+    and `sigma` their annual volatility.
+
+    Paths are generated in fixed blocks of BLOCK_PATHS, each from its own
+    child of SeedSequence(seed) (or of `seed` itself when it is a SeedSequence),
+    so a seeded run gives identical results with any number of workers.
+    workers > 1 spreads the blocks over a process pool.
+    """
+    if paths < 1 or workers < 1:
+        raise ValueError(f"paths and workers must be at least 1, got {paths} and {workers}")
+    sizes = [BLOCK_PATHS] * (paths // BLOCK_PATHS) + ([paths % BLOCK_PATHS] if paths % BLOCK_PATHS else [])
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = root.spawn(len(sizes))
+    tasks = [(child, size, months, start_value, contribution, mu, sigma) for child, size in zip(seeds, sizes)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            blocks = list(pool.map(_simulate_block, tasks))
+    else:
+        blocks = [_simulate_block(task) for task in tasks]
+    return np.concatenate(blocks)
+
+
+def _monthly_contribution(cursor, goal_id, as_of):
+    """Average SIP per contribution month over the last year (0 when the goal has no SIPs)."""
+    since = (datetime.date.fromisoformat(as_of) - datetime.timedelta(days=365)).isoformat()
+    cursor.execute("""
+        SELECT TOTAL(amount), COUNT(DISTINCT substr(investment_date, 1, 7)) FROM goal_investments
+        WHERE goal_id = ? AND investment_type = 'SIP' AND investment_date > ? AND investment_date <= ?
+    """, (goal_id, since, as_of))
+    total, months = cursor.fetchone()
+    return total / months if months else 0.0
+
+
+def simulate_goals(goal_ids=None, paths=100000, seed=None, workers=1, mu=None, sigma=None, conn=None):
+    """Probability of each goal reaching its target by its deadline, by Monte Carlo simulation.
+
+    Paths start from the goal's recorded current value (else the amount
+    invested so far) and keep adding its average monthly SIP. Drift and
+    volatility come from estimate_parameters() unless given; a goal's own
+    expected_cagr is the drift fallback when there is no usable history.
+    Volatility has no fallback, so without enough history `sigma` must be
+    given (else ValueError).
+
+    Each goal draws from its own SeedSequence(seed, spawn_key=(goal id,)), so
+    goals get independent shocks and a goal's result doesn't depend on which
+    others are simulated with it. Returns one dict per goal.
+    """
+    conn = conn or get_connection()
+    cursor = conn.cursor()
+    today = datetime.date.today().isoformat()
+    estimate = estimate_parameters(conn) if mu is None or sigma is None else None
+    if sigma is None and estimate is None:
+        raise ValueError(f"Not enough price history ({MIN_RETURN_DAYS} trading days of the current holdings) "
+                         "to estimate volatility; give sigma (--sigma) explicitly")
+
+    query = """
+        SELECT g.id, g.name, g.target_amount, g.time_horizon, g.expected_cagr, g.goal_creation_date,
+               COALESCE(g.current_value, (SELECT TOTAL(amount) FROM goal_investments WHERE goal_id = g.id))
+        FROM goals g
+    """
+    if goal_ids:
+        query += f" WHERE g.id IN ({', '.join('?' * len(goal_ids))})"
+    cursor.execute(query + " ORDER BY g.id", tuple(goal_ids or ()))
+
+    results = []
+    for goal_id, name, target, horizon, expected, created, start_value in cursor.fetchall():
+        deadline = _deadline(created, horizon)
+        months = max(0, round((datetime.date.fromisoformat(deadline) - datetime.date.today()).days / 30.44))
+        goal_mu = mu if mu is not None else (estimate[0] if estimate else (math.log1p(expected / 100) if expected else None))
+        goal_sigma = sigma if sigma is not None else estimate[1]
+        result = {
+            "id": goal_id, "name": name, "target_amount": target, "deadline": deadline, "months": months,
+            "start_value": start_value, "monthly_contribution": _monthly_contribution(cursor, goal_id, today),
+            "mu": goal_mu, "sigma": goal_sigma, "paths": paths, "seed": seed,
+        }
+        if goal_mu is None:
+            result["probability"] = None
+        else:
+            finals = simulate_paths(start_value, result["monthly_contribution"], months, goal_mu, goal_sigma,
+                                    paths=paths, seed=np.random.SeedSequence(seed, spawn_key=(goal_id,)),
+                                    workers=workers)
+            p10, p50, p90 = np.percentile(finals, [10, 50, 90])
+            shortfall = np.maximum(target - finals, 0)
+            result.update({
+                "probability": float((finals >= target).mean()),
+                "p10": float(p10), "median": float(p50), "p90": float(p90),
+                "expected_shortfall": float(shortfall[shortfall > 0].mean()) if (shortfall > 0).any() else 0.0,
+            })
+        results.append(result)
+    return results
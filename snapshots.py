@@ -0,0 +1,178 @@
+import datetime
+
+from fx import load_rate_table, lookup_rate
+
+# portfolio_history keeps native-currency sums (inr_exposure doubles as the INR value)
+# and derives the INR totals from them with the row's own usd_rate
+_DERIVE_TOTALS = """
+    total_cost = inr_cost + usd_cost_native * usd_rate,
+    total_value = inr_exposure + usd_value_native * usd_rate,
+    usd_exposure = usd_value_native * usd_rate,
+    profit_loss = (inr_exposure + usd_value_native * usd_rate) - (inr_cost + usd_cost_native * usd_rate)
+"""
+
+# Per-day sums over lots held on that day (purchase_date <= date) that have a price that day
+_SNAPSHOT_QUERY = """
+    SELECT ph.date,
+           SUM(CASE WHEN p.currency = 'USD' THEN 0 ELSE p.purchase_price * p.units END),
+           SUM(CASE WHEN p.currency = 'USD' THEN 0 ELSE ph.price * p.units END),
+           SUM(CASE WHEN p.currency = 'USD' THEN p.purchase_price * p.units ELSE 0 END),
+           SUM(CASE WHEN p.currency = 'USD' THEN ph.price * p.units ELSE 0 END)
+    FROM price_history ph
+    JOIN portfolio p ON p.symbol = ph.symbol AND p.purchase_date <= ph.date
+    WHERE ph.date IN ({dates})
+    GROUP BY ph.date
+"""
+
+
+def _today():
+    return datetime.datetime.today().strftime("%Y-%m-%d")
+
+
+def _write_rows(cursor, sums, rate_table):
+    rows = []
+    for date, inr_cost, inr_value, usd_cost, usd_value in sums:
+        rate = lookup_rate(rate_table, date)
+        total_cost = inr_cost + usd_cost * rate
+        total_value = inr_value + usd_value * rate
+        rows.append((date, total_value, total_cost, total_value - total_cost, inr_value, usd_value * rate,
+                     rate, inr_cost, usd_cost, usd_value))
+    cursor.executemany("""
+        INSERT INTO portfolio_history
+        (date, total_value, total_cost, profit_loss, inr_exposure, usd_exposure,
+         usd_rate, inr_cost, usd_cost_native, usd_value_native)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+def rebuild_dates(conn, dates):
+    """Recomputes the snapshot rows for the given dates from stored prices and FX (no network)."""
+    dates = sorted(set(dates))
+    if not dates:
+        return 0
+    cursor = conn.cursor()
+    rate_table = load_rate_table(conn=conn)
+    written = 0
+    for start in range(0, len(dates), 500):  # Stay under SQLite's bound-parameter limit
+        chunk = dates[start:start + 500]
+        cursor.execute(_SNAPSHOT_QUERY.format(dates=", ".join("?" * len(chunk))), chunk)
+        sums = {row[0]: row for row in cursor.fetchall()}
+        # Days priced only for symbols not held yet still get an (all-zero) row
+        rows = [sums.get(date, (date, 0.0, 0.0, 0.0, 0.0)) for date in chunk]
+        written += _write_rows(cursor, rows, rate_table)
+    return written
+
+
+def missing_dates(conn, start=None, end=None):
+    """Dates with stored prices but no snapshot row, optionally within [start, end].
+
+    Without `start`, only days after the newest snapshot are considered, so on
+    a normal startup this is a single index range probe. Recorded rows are never
+    missing: pre-migration rows keep their recorded totals (migration _014)
+    rather than being rebuilt with whatever FX rate is stored today.
+    """
+    cursor = conn.cursor()
+    if start is None:
+        cursor.execute("SELECT MAX(date) FROM portfolio_history")
+        latest = cursor.fetchone()[0]
+        if latest:
+            start = (datetime.date.fromisoformat(latest) + datetime.timedelta(days=1)).isoformat()
+    cursor.execute("""
+        SELECT DISTINCT ph.date FROM price_history ph
+        WHERE ph.date >= ? AND ph.date <= ?
+          AND NOT EXISTS (SELECT 1 FROM portfolio_history h WHERE h.date = ph.date)
+    """, (start or "0000-00-00", end or _today()))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def backfill(conn, start=None, end=None):
+    """Fills in every missing snapshot day from stored prices in one pass. Returns rows written."""
+    with conn:
+        return rebuild_dates(conn, missing_dates(conn, start, end))
+
+
+def apply_lot_change(conn, symbol, purchase_date, purchase_price, units, currency, sign=1):
+    """Adds (sign=1) or removes (sign=-1) one lot's contribution to every snapshot on or after its purchase date.
+
+    Only days on which the symbol has a stored price are touched, matching how
+    snapshots are built. The caller owns the transaction.
+    """
+    usd = currency == "USD"
+    cost = sign * purchase_price * units
+    conn.execute("""
+        UPDATE portfolio_history SET
+            inr_cost = inr_cost + :inr_cost,
+            inr_exposure = inr_exposure + :inr_units * ph.price,
+            usd_cost_native = usd_cost_native + :usd_cost,
+            usd_value_native = usd_value_native + :usd_units * ph.price
+        FROM price_history ph
+        WHERE ph.symbol = :symbol AND ph.date = portfolio_history.date
+          AND portfolio_history.date >= :purchase_date AND portfolio_history.usd_rate IS NOT NULL
+    """, {
+        "symbol": symbol,
+        "purchase_date": purchase_date,
+        "inr_cost": 0 if usd else cost,
+        "inr_units": 0 if usd else sign * units,
+        "usd_cost": cost if usd else 0,
+        "usd_units": sign * units if usd else 0,
+    })
+    conn.execute(f"UPDATE portfolio_history SET {_DERIVE_TOTALS} WHERE date >= ? AND usd_rate IS NOT NULL",
+                 (purchase_date,))
+
+
+def apply_price_changes(conn, date, changes, usd_rate=None):
+    """Applies newly written prices for one day to that day's snapshot.
+
+    `changes` is a list of (symbol, new_price, old_price) where old_price is the
+    price previously stored for that same day, or None. A day with no snapshot
+    yet is built from stored prices instead. The caller owns the transaction.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT usd_rate FROM portfolio_history WHERE date = ?", (date,))
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        rebuild_dates(conn, [date])
+        if usd_rate is not None:
+            conn.execute("UPDATE portfolio_history SET usd_rate = ? WHERE date = ?", (usd_rate, date))
+            conn.execute(f"UPDATE portfolio_history SET {_DERIVE_TOTALS} WHERE date = ?", (date,))
+        return
+
+    changes = [change for change in changes if change[1] != change[2]]
+    if not changes:
+        return
+
+    # Units and cost held per changed symbol on that day, split by currency
+    symbols = [change[0] for change in changes]
+    held = {}
+    for start in range(0, len(symbols), 500):
+        chunk = symbols[start:start + 500]
+        cursor.execute(f"""
+            SELECT symbol, currency = 'USD', SUM(units), SUM(purchase_price * units)
+            FROM portfolio
+            WHERE symbol IN ({", ".join("?" * len(chunk))}) AND purchase_date <= ?
+            GROUP BY symbol, currency = 'USD'
+        """, (*chunk, date))
+        for symbol, usd, units, cost in cursor.fetchall():
+            held.setdefault(symbol, []).append((bool(usd), units, cost))
+
+    inr_cost = inr_value = usd_cost = usd_value = 0.0
+    for symbol, new_price, old_price in changes:
+        for usd, units, cost in held.get(symbol, ()):
+            value_delta = units * (new_price - (old_price or 0))
+            cost_delta = cost if old_price is None else 0  # Newly priced lots start counting their cost
+            if usd:
+                usd_value += value_delta
+                usd_cost += cost_delta
+            else:
+                inr_value += value_delta
+                inr_cost += cost_delta
+
+    conn.execute("""
+        UPDATE portfolio_history SET
+            inr_cost = inr_cost + ?, inr_exposure = inr_exposure + ?,
+            usd_cost_native = usd_cost_native + ?, usd_value_native = usd_value_native + ?,
+            usd_rate = COALESCE(?, usd_rate)
+        WHERE date = ?
+    """, (inr_cost, inr_value, usd_cost, usd_value, usd_rate, date))
+    conn.execute(f"UPDATE portfolio_history SET {_DERIVE_TOTALS} WHERE date = ?", (date,))
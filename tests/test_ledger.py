@@ -0,0 +1,73 @@
+import pytest
+
+import db
+import ledger
+
+
+@pytest.fixture
+def conn(tmp_path):
+    db.set_db_path(str(tmp_path / "portfolio.db"))
+    conn = db.get_connection()
+    yield conn
+    db.close_all()
+
+
+def add_lot(conn, symbol, date, price, units):
+    with conn:
+        cursor = conn.execute("""
+            INSERT INTO portfolio (investment_type, symbol, name, purchase_date, purchase_price, units, currency)
+            VALUES ('Stock', ?, ?, ?, ?, ?, 'INR')
+        """, (symbol, symbol, date, price, units))
+        ledger.record_transactions(conn, [(date, symbol, "Stock", "BUY", units, price, 0, "INR", cursor.lastrowid, None)])
+    return cursor.lastrowid
+
+
+def portfolio_units(conn, symbol):
+    return conn.execute("SELECT TOTAL(units) FROM portfolio WHERE symbol = ?", (symbol,)).fetchone()[0]
+
+
+def test_split_then_sell_keeps_ledger_and_portfolio_in_step(conn):
+    add_lot(conn, "INFY.NS", "2024-01-10", 1500, 10)
+
+    book = ledger.record("SPLIT", "INFY.NS", "2024-06-01", units=2, conn=conn)
+    assert book.units == pytest.approx(20)
+    assert portfolio_units(conn, "INFY.NS") == pytest.approx(20)
+    assert conn.execute("SELECT purchase_price FROM portfolio").fetchone()[0] == pytest.approx(750)
+
+    book = ledger.record("SELL", "INFY.NS", "2024-07-01", units=15, price=800, conn=conn)
+    assert book.units == pytest.approx(5)
+    assert portfolio_units(conn, "INFY.NS") == pytest.approx(5)
+
+
+def test_deleting_an_untouched_lot_removes_it_from_both_books(conn):
+    add_lot(conn, "TCS.NS", "2024-01-10", 3000, 10)
+    second = add_lot(conn, "TCS.NS", "2024-02-10", 3100, 5)
+
+    with conn:
+        assert ledger.remove_lot(conn, second)
+    assert ledger.load_books(conn, "2024-12-31")["TCS.NS"].units == pytest.approx(10)
+    assert portfolio_units(conn, "TCS.NS") == pytest.approx(10)
+
+
+def test_deleting_a_lot_a_sale_was_matched_against_is_rejected(conn):
+    first = add_lot(conn, "TCS.NS", "2024-01-10", 3000, 10)
+    add_lot(conn, "TCS.NS", "2024-02-10", 3100, 10)
+    ledger.record("SELL", "TCS.NS", "2024-03-01", units=5, price=3200, conn=conn)
+
+    with pytest.raises(ValueError):
+        with conn:
+            ledger.remove_lot(conn, first)
+    assert ledger.load_books(conn, "2024-12-31")["TCS.NS"].units == pytest.approx(15)
+    assert portfolio_units(conn, "TCS.NS") == pytest.approx(15)
+
+
+def test_deleting_a_lot_that_covers_a_later_sale_is_rejected(conn):
+    add_lot(conn, "TCS.NS", "2024-01-10", 3000, 10)
+    second = add_lot(conn, "TCS.NS", "2024-02-10", 3100, 10)
+    ledger.record("SELL", "TCS.NS", "2024-03-01", units=10, price=3200, conn=conn)
+    ledger.record("SELL", "TCS.NS", "2024-04-01", units=5, price=3300, conn=conn)
+
+    with pytest.raises(ValueError, match="would exceed"):
+        with conn:
+            ledger.remove_lot(conn, second)
+    assert portfolio_units(conn, "TCS.NS") == pytest.approx(5)
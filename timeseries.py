@@ -0,0 +1,128 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from fx import load_rate_table, FALLBACK_USD_INR
+
+_matrix_cache = {}  # database path -> (price_history version, symbols, matrix)
+
+SERIES_COLUMNS = ["total_value", "total_cost", "profit_loss", "inr_exposure", "usd_exposure"]
+
+
+def _load_lots(conn, end):
+    return pd.read_sql_query("""
+        SELECT symbol, currency, purchase_date, purchase_price, units
+        FROM portfolio
+        WHERE purchase_date <= ? AND purchase_price IS NOT NULL
+    """, conn, params=(end,))
+
+
+def _forward_fill(matrix):
+    """Forward-fills NaNs down each column of a 2-D array."""
+    rows = np.arange(matrix.shape[0])[:, None]
+    last_valid = np.where(np.isnan(matrix), 0, rows)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return matrix[last_valid, np.arange(matrix.shape[1])]
+
+
+def load_price_matrix(conn, symbols):
+    """Returns (trading_dates, symbols, forward-filled price matrix) for every stored price of `symbols`.
+
+    The matrix is cached per database and symbol set, and only rebuilt when
+    price_history changes, so repeated windows skip the SQLite read entirely.
+    """
+    symbols = sorted(set(symbols))
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    version = conn.execute("SELECT MAX(id), COUNT(*) FROM price_history").fetchone()
+    cached = _matrix_cache.get(path)
+    if cached and cached[0] == version and cached[1] == symbols:
+        return cached[2]
+
+    rows = []
+    cursor = conn.cursor()
+    for offset in range(0, len(symbols), 500):
+        chunk = symbols[offset:offset + 500]
+        cursor.execute(
+            f"SELECT symbol, date, price FROM price_history WHERE symbol IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        rows.extend(cursor.fetchall())
+
+    frame = pd.DataFrame.from_records(rows, columns=["symbol", "date", "price"])
+    date_codes, dates = pd.factorize(frame["date"], sort=True)
+    symbol_codes = pd.Index(symbols).get_indexer(frame["symbol"])
+    matrix = np.full((len(dates), len(symbols)), np.nan)
+    matrix[date_codes, symbol_codes] = frame["price"].to_numpy(dtype=float)
+
+    result = (pd.DatetimeIndex(pd.to_datetime(dates)), pd.Index(symbols), _forward_fill(matrix))
+    _matrix_cache[path] = (version, symbols, result)
+    return result
+
+
+def _fx_series(calendar, conn):
+    dates, rates = load_rate_table(conn=conn)
+    if not dates:
+        return np.full(len(calendar), FALLBACK_USD_INR)
+    series = pd.Series(rates, index=pd.to_datetime(dates))
+    series = series[~series.index.duplicated(keep="last")]
+    # Rate in effect on each day; days before the first stored rate use the earliest one
+    return series.reindex(series.index.union(calendar)).ffill().bfill().reindex(calendar).to_numpy()
+
+
+def portfolio_timeseries(conn, start, end=None):
+    """Rebuilds daily portfolio value, cost, P/L and INR/USD exposure for every calendar day in [start, end].
+
+    Works entirely from stored data: lots from `portfolio` (counted from their
+    purchase date), prices from `price_history` forward-filled over a date x
+    symbol matrix, and USD/INR rates from `fx_rates`. A lot's cost is counted
+    once its symbol has a price, matching the snapshot rows. Returns a
+    DataFrame indexed by date with SERIES_COLUMNS.
+    """
+    end = end or datetime.date.today().isoformat()
+    calendar = pd.date_range(start, end, freq="D")
+    empty = pd.DataFrame(0.0, index=calendar, columns=SERIES_COLUMNS)
+
+    lots = _load_lots(conn, end)
+    if lots.empty or calendar.empty:
+        return empty
+
+    # One column per (symbol, currency) so a symbol held in two currencies still converts correctly
+    lots["key"] = lots["symbol"] + "|" + lots["currency"]
+    keys = pd.Index(sorted(lots["key"].unique()))
+    key_symbols = keys.str.split("|").str[0]
+    usd = keys.str.endswith("|USD")
+
+    # Units and cost held per day: lot deltas on purchase dates (earlier ones collapse onto `start`), cumulated
+    purchase = pd.to_datetime(lots["purchase_date"]).clip(lower=calendar[0])
+    lots["cost"] = lots["purchase_price"] * lots["units"]
+    deltas = lots.assign(day=purchase).pivot_table(index="day", columns="key", values=["units", "cost"], aggfunc="sum")
+    units = deltas["units"].reindex(index=calendar, columns=keys).fillna(0).cumsum().to_numpy()
+    cost = deltas["cost"].reindex(index=calendar, columns=keys).fillna(0).cumsum().to_numpy()
+
+    # Price matrix: stored prices as trading-date x symbol, forward-filled, then sampled on calendar days
+    trading_dates, symbols, matrix = load_price_matrix(conn, key_symbols)
+    if not len(trading_dates):
+        return empty
+    row = trading_dates.searchsorted(calendar, side="right") - 1
+    price = matrix[np.clip(row, 0, None)][:, symbols.get_indexer(key_symbols)]
+    price[row < 0] = np.nan  # Calendar days before the first stored price
+
+    priced = ~np.isnan(price)
+    value = np.where(priced, units * np.nan_to_num(price), 0.0)
+    cost = np.where(priced, cost, 0.0)
+
+    fx = np.where(usd, _fx_series(calendar, conn)[:, None], 1.0)
+    value_inr = value * fx
+    cost_inr = cost * fx
+
+    usd_exposure = value_inr[:, usd].sum(axis=1)
+    inr_exposure = value_inr[:, ~usd].sum(axis=1)
+    total_value = usd_exposure + inr_exposure
+    total_cost = cost_inr.sum(axis=1)
+    return pd.DataFrame({
+        "total_value": total_value,
+        "total_cost": total_cost,
+        "profit_loss": total_value - total_cost,
+        "inr_exposure": inr_exposure,
+        "usd_exposure": usd_exposure,
+    }, index=calendar)
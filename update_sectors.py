@@ -1,42 +1,141 @@
-import sqlite3
-import yfinance as yf
+import argparse
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def update_existing_stocks():
-    """Fetch and update sector/industry info for stocks missing them."""
-    conn = sqlite3.connect("portfolio.db")
+from db import get_connection
+from http_client import TokenBucket
+from migrations import migrate
+from securities import get_cached_securities, fetch_metadata, store_security
+
+JOB = "sectors"
+
+
+def _pending_symbols(conn, restart):
+    """Distinct stock symbols still missing a sector, minus those this job already processed."""
     cursor = conn.cursor()
+    if restart:
+        with conn:
+            cursor.execute("DELETE FROM backfill_progress WHERE job = ?", (JOB,))
+    cursor.execute("""
+        SELECT DISTINCT symbol FROM portfolio
+        WHERE investment_type = 'Stock' AND (sector IS NULL OR sector = 'N/A')
+          AND symbol NOT IN (SELECT item FROM backfill_progress WHERE job = ?)
+        ORDER BY symbol
+    """, (JOB,))
+    return [row[0] for row in cursor.fetchall()]
 
-    # Fetch all stocks that need sector info
-    cursor.execute("SELECT id, symbol FROM portfolio WHERE sector IS NULL OR sector = 'N/A'")
-    stocks_to_update = cursor.fetchall()
 
-    if not stocks_to_update:
+def _fetch(symbol, provider, limiter):
+    """One rate-limited provider call; runs on a worker thread and never writes."""
+    if limiter:
+        limiter.acquire()
+    return fetch_metadata(symbol, "Stock", provider)
+
+
+def _chain_results(cached, futures):
+    """Yields (symbol, metadata) for cached symbols first, then fetches as they finish (errors as values)."""
+    yield from cached
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result()
+        except Exception as e:
+            yield futures[future], e
+
+
+def update_existing_stocks(provider=None, max_workers=8, rate=5.0, batch_size=50, restart=False):
+    """Backfills sector/industry for stocks missing them: one lookup per symbol, batched commits, resumable.
+
+    Symbols are fetched on a bounded thread pool at most `rate` requests/second.
+    Every processed symbol is recorded in backfill_progress in the same commit
+    as its update, so a rerun after a crash skips finished work; a completed
+    run clears its progress so the next run retries symbols that had no data.
+    """
+    conn = get_connection()
+    migrate(conn)
+    cursor = conn.cursor()
+
+    symbols = _pending_symbols(conn, restart)
+    if not symbols:
         print("✅ All stocks already have sector information!")
         return
 
-    print(f"🔄 Updating {len(stocks_to_update)} stocks with missing sector info...")
+    print(f"🔄 Updating sector info for {len(symbols)} symbols...")
+    limiter = TokenBucket(rate) if rate else None
+    started = time.perf_counter()
+    updated_rows = fetched = missing = failed = pending = 0
 
-    for stock_id, symbol in stocks_to_update:
-        try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            sector = info.get("sector", "N/A")
-            industry = info.get("industry", "N/A")
+    # Symbols whose sector is already cached need no network call at all
+    cached = {
+        symbol: security for symbol, security in get_cached_securities(symbols).items()
+        if security["sector"] not in (None, "N/A")
+    }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_fetch, symbol, provider, limiter): symbol for symbol in symbols if symbol not in cached}
+        results = ((symbol, security) for symbol, security in cached.items())
+        for symbol, security in _chain_results(results, futures):
+            if isinstance(security, Exception):
+                print(f"❌ Error updating {symbol}: {security}")
+                failed += 1
+                continue  # Not recorded, so a resumed run retries it
+            if symbol not in cached:
+                fetched += 1
+                if security:
+                    security = store_security(symbol, "Stock", security, commit=False)
 
+            sector = (security or {}).get("sector") or "N/A"
+            industry = (security or {}).get("industry") or "N/A"
             if sector != "N/A":  # Only update if data is found
                 cursor.execute("""
-                    UPDATE portfolio SET sector = ?, industry = ? WHERE id = ?
-                """, (sector, industry, stock_id))
+                    UPDATE portfolio SET sector = ?, industry = ?
+                    WHERE symbol = ? AND (sector IS NULL OR sector = 'N/A')
+                """, (sector, industry, symbol))
+                updated_rows += cursor.rowcount
+                status = "updated"
                 print(f"✅ Updated {symbol} → Sector: {sector}, Industry: {industry}")
             else:
+                missing += 1
+                status = "no_data"
                 print(f"⚠️ No sector data found for {symbol}")
+            cursor.execute(
+                "REPLACE INTO backfill_progress (job, item, status, updated_at) VALUES (?, ?, ?, ?)",
+                (JOB, symbol, status, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
 
-        except Exception as e:
-            print(f"❌ Error updating {symbol}: {e}")
+            pending += 1
+            if pending >= batch_size:
+                conn.commit()
+                pending = 0
 
     conn.commit()
-    conn.close()
-    print("✅ Sector info update completed!")
+    if not failed:
+        with conn:
+            cursor.execute("DELETE FROM backfill_progress WHERE job = ?", (JOB,))
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ Sector info update completed! {len(symbols)} symbols ({fetched} fetched, {missing} without data, "
+        f"{failed} failed), {updated_rows} lots updated in {elapsed:.1f}s "
+        f"({len(symbols) / elapsed if elapsed else 0:.1f} symbols/s)"
+    )
+    if failed:
+        print("🔁 Rerun to retry the failed symbols; finished ones will be skipped.")
+
+
+def add_arguments(parser):
+    """Registers the backfill's options on an argparse (sub)parser."""
+    parser.add_argument("--workers", type=int, default=8, help="concurrent lookups (default: 8)")
+    parser.add_argument("--rate", type=float, default=5.0, help="max provider requests per second (default: 5)")
+    parser.add_argument("--batch-size", type=int, default=50, help="symbols per commit (default: 50)")
+    parser.add_argument("--restart", action="store_true", help="ignore progress from an interrupted run")
+
+
+def run(args):
+    update_existing_stocks(max_workers=args.workers, rate=args.rate, batch_size=args.batch_size, restart=args.restart)
+
 
-# Run the update function
-update_existing_stocks()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill missing sector/industry info for stocks.")
+    add_arguments(parser)
+    run(parser.parse_args())
@@ -0,0 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from providers import get_provider
+from price_refresh import split_symbols
+
+QUOTE_WORKERS = 8
+QUOTE_TIMEOUT = 15  # Seconds to wait for all quotes before showing N/A
+STOCK_BATCH = 50    # Symbols per bulk stock request
+
+HOLDING_COLUMNS = [
+    "id", "investment_type", "symbol", "name", "sector", "industry",
+    "purchase_date", "purchase_price", "units", "currency",
+]
+
+
+def fetch_portfolio_quotes(records, provider=None, max_workers=QUOTE_WORKERS, timeout=QUOTE_TIMEOUT):
+    """Fetches live prices for every holding in `view_portfolio()` records concurrently.
+
+    Stocks go out in bulk batches and mutual fund NAVs one request each, all on a
+    bounded thread pool. Anything that fails or is still running after `timeout`
+    seconds is reported as None so the screen can show "N/A" instead of blocking.
+    """
+    provider = provider or get_provider()
+    stocks, funds = split_symbols((record[2], record[1]) for record in records)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {}
+    for start in range(0, len(stocks), STOCK_BATCH):
+        batch = stocks[start:start + STOCK_BATCH]
+        futures[pool.submit(provider.get_quotes, batch)] = batch
+    for scheme_code in funds:
+        futures[pool.submit(provider.get_nav, scheme_code)] = scheme_code
+
+    done, _ = wait(futures, timeout=timeout)
+    pool.shutdown(wait=False, cancel_futures=True)  # Don't let a hung request hold the screen
+
+    quotes = dict.fromkeys(stocks + funds)
+    for future in done:
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"⚠️ Error fetching price for {futures[future]}: {e}")
+            continue
+        if isinstance(result, dict):
+            quotes.update(result)
+        elif result is not None:
+            quotes[futures[future]] = result
+
+    return {symbol: round(price, 2) if price is not None else None for symbol, price in quotes.items()}
+
+
+def get_previous_prices(conn, symbols=None):
+    """Returns symbol -> second most recent price, read straight from latest_price."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT symbol, prev_price FROM latest_price WHERE prev_price IS NOT NULL")
+    previous = dict(cursor.fetchall())
+    if symbols is not None:
+        previous = {symbol: previous[symbol] for symbol in symbols if symbol in previous}
+    return previous
+
+
+def holdings_frame(records):
+    """Builds a holdings DataFrame from `view_portfolio()` records."""
+    return pd.DataFrame.from_records(records, columns=HOLDING_COLUMNS)
+
+
+def load_holdings(conn, investment_type=None):
+    """Loads portfolio lots straight into a DataFrame, optionally for one investment type."""
+    query = f"SELECT {', '.join(HOLDING_COLUMNS)} FROM portfolio"
+    params = ()
+    if investment_type:
+        query += " WHERE investment_type = ?"
+        params = (investment_type,)
+    return pd.read_sql_query(query, conn, params=params)
+
+
+def load_prices(conn, date=None):
+    """Returns a symbol-indexed Series of prices: the latest ones, or those recorded on `date`."""
+    if date:
+        frame = pd.read_sql_query("SELECT symbol, price FROM price_history WHERE date = ?", conn, params=(date,))
+    else:
+        frame = pd.read_sql_query("SELECT symbol, price FROM latest_price", conn)
+    return frame.set_index("symbol")["price"]
+
+
+def value_holdings(holdings, prices, usd_rate):
+    """Adds per-lot price, cost, value and P/L columns (original currency and INR) to a holdings frame.
+
+    `prices` is anything mapping symbol -> price (dict or Series); lots without a
+    price get NaN value/P/L so callers choose whether to skip or zero them.
+    """
+    valued = holdings.copy()
+    units = valued["units"].to_numpy(dtype=float)
+    cost = valued["purchase_price"].to_numpy(dtype=float) * units
+    price = valued["symbol"].map(prices).to_numpy(dtype=float)
+    value = price * units
+    fx_rate = np.where(valued["currency"].to_numpy() == "USD", usd_rate, 1.0)
+
+    valued["price"] = price
+    valued["cost"] = cost
+    valued["value"] = value
+    valued["profit_loss"] = value - cost
+    with np.errstate(divide="ignore", invalid="ignore"):
+        valued["pl_pct"] = np.where(cost != 0, (value - cost) / cost * 100, np.nan)
+    valued["fx_rate"] = fx_rate
+    valued["cost_inr"] = cost * fx_rate
+    valued["value_inr"] = value * fx_rate
+    valued["profit_loss_inr"] = valued["value_inr"] - valued["cost_inr"]
+    return valued
+
+
+def portfolio_totals(valued, priced_only=False):
+    """Aggregates a `value_holdings()` frame into INR totals, overall and per investment type.
+
+    With `priced_only` lots without a price are left out entirely; otherwise their
+    cost still counts and their value is taken as zero.
+    """
+    if priced_only:
+        valued = valued[valued["price"].notna()]
+    frame = pd.DataFrame({
+        "investment_type": valued["investment_type"].to_numpy(),
+        "cost": valued["cost_inr"].to_numpy(),
+        "value": np.nan_to_num(valued["value_inr"].to_numpy()),
+        "usd": valued["currency"].to_numpy() == "USD",
+    })
+    by_type = frame.groupby("investment_type")[["cost", "value"]].sum()
+
+    total_cost = float(frame["cost"].sum())
+    total_value = float(frame["value"].sum())
+    usd_exposure = float(frame.loc[frame["usd"], "value"].sum())
+    return {
+        "total_cost": total_cost,
+        "total_value": total_value,
+        "profit_loss": total_value - total_cost,
+        "inr_exposure": total_value - usd_exposure,
+        "usd_exposure": usd_exposure,
+        "by_type": {
+            investment_type: {"cost": float(row.cost), "value": float(row.value)}
+            for investment_type, row in by_type.iterrows()
+        },
+    }
+
+
+def allocation(valued, by):
+    """Returns (key, INR value, percentage) rows of priced holdings grouped by a column, largest first."""
+    priced = valued[valued["price"].notna() & (valued["price"] != 0)]
+    values = priced.groupby(by, dropna=False)["value_inr"].sum()
+    total = values.sum()
+    percentages = values / total * 100 if total > 0 else values * 0
+    result = pd.DataFrame({"value": values, "percentage": percentages}).sort_values("percentage", ascending=False)
+    return list(result.itertuples(name=None))